@@ -2,29 +2,94 @@ import socket
 import os
 import struct
 import threading
-from hashlib import blake2b
-from cryptography.hazmat.primitives import serialization, hashes, padding as sym_padding
+import time
+import queue
+import uuid
+from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import rsa, padding as asym_padding
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from advertise import *
-from config import METADATA_MAGIC
-from helpers import get_current_ip
+from config import CHUNK_SIZE, METADATA_MAGIC, FEC_MAGIC, DELTA_MAGIC, PENDING_PACKET_LIMIT, MULTICAST_IDLE_TIMEOUT
+from config import RECV_BUFFER_BYTES, RECEIVE_WORKERS, RECEIVE_QUEUE_LIMIT, IO_BATCH_SIZE, REPAIR_MAX_ROUNDS
+from config import MULTICAST_SETTLE, REPAIR_MAX_SECONDS, CHECKPOINT_INTERVAL, REPAIR_RESUME_GRACE
+from config import METRICS_DIR, METRICS_PROMETHEUS, CONGESTION_CONTROL, FEEDBACK_INTERVAL
+from config import MULTICAST_FIRST_PACKET_TIMEOUT
+from config import HANDSHAKE_MODE, RECEIVER_IDENTITY_FILE, SESSION_TICKETS, RECEIVER_TICKET_FILE, TICKET_LIFETIME
+from checkpoint import CheckpointStore
+from handshake import TicketStore, load_identity, receiver_exchange
+from metrics import Metrics
+from fec import PARITY_HEADER
+from helpers import get_current_ip, send_frame, recv_frame
+from nack import encode_nack, NACK_MAX_SECTIONS
+from transfer_files import IncomingFile, find_owner
+from compression import available_codecs, unpack_chunk
+from batch_io import DatagramReceiver
+from mtu import MAX_CHUNK_SIZE
+from congestion import FEEDBACK, FEEDBACK_MAGIC, LossMeter
+from packet_crypto import PacketCipher, CIPHER_MODES, PACKET_DATA, PACKET_PARITY, PACKET_RECIPE, PACKET_MANIFEST
+
+# Datagrams that are not data packets; the rest start with their seq
+CONTROL_MAGICS = (METADATA_MAGIC, FEC_MAGIC, DELTA_MAGIC)
+
+
+def open_multicast_socket(group, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_BYTES)
+    sock.bind(('', port))
+    mreq = struct.pack("4sl", socket.inet_aton(group), socket.INADDR_ANY)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    sock.settimeout(0.5)  # lets the loop notice close_multicast()
+    return sock
+
+
 class SecureReceiver:
-    def __init__(self, tcp_port=9999, mcast_port=5007, repair_port=10000):
+    def __init__(self, tcp_port=9999, mcast_port=5007, repair_port=10000, output_dir="./received_files/",
+                 workers=RECEIVE_WORKERS, handshake_mode=HANDSHAKE_MODE, checkpoint=None):
         self.private_key = None
         self.public_key = None
+        self.handshake_mode = handshake_mode
+        self.identity = None  # X25519 identity key, loaded on the first handshake
+        self.tickets = None
         self.aes_key = None
+        self.cipher = None
         self.tcp_port = tcp_port
         self.cur_ip = 'localhost'
         self.repair_port = repair_port
         self.mcast_group = '224.1.1.1'
         self.mcast_port = mcast_port
         self.group_name = 'Default Group Name'
-        self.received_packets = {}
-        self.expected_total = 4
-        self.filename = ''
-
+        self.stripes = 1  # the sender may stripe over mcast_port .. mcast_port + stripes - 1
+        self.compression = "none"  # when not "none", data messages carry a flags byte before the chunk
+        self.files = {}  # file_id -> IncomingFile, one per metadata packet seen
+        self.by_base = []  # the same files ordered by seq_base, for seq lookups
+        self.bases = []
+        self.pending = {}  # packets that arrived before their file's metadata, keyed by seq
+        self.file_count = 0  # files in the session, as announced by every manifest
+        self.multicast_done = threading.Event()
+        self.first_pass_over = threading.Event()  # however the first pass ended; stops feedback
+        self.output_dir = output_dir
+        self.workers = workers
+        self.lock = threading.RLock()  # guards per-file bitmaps, sinks and FEC state across workers
+        self.checkpoint = checkpoint or CheckpointStore()
+        self.socket_pool = None  # pre-joined multicast sockets, when run by ReceiverDaemon
+        # claim_channel(group, port) -> a release callable, or None while another transfer
+        # uses that group and port; set by ReceiverDaemon so a second sender is turned away
+        self.claim_channel = None
+        self.release_channel = None  # held from the handshake until the multicast sockets close
+        self.session_id = None
+        self.metrics = Metrics("receiver")
+        self.datagrams = self.metrics.counter("datagrams_received", "Multicast datagrams taken off the sockets")
+        self.bytes_received = self.metrics.counter("bytes_received", "Multicast datagram bytes received")
+        self.decrypt_failures = self.metrics.counter("decrypt_failures", "Packets that failed authentication")
+        self.duplicates = self.metrics.counter("duplicate_packets", "Data packets already held")
+        self.repair_rounds = self.metrics.counter("repair_rounds", "NACK rounds sent")
+        self.repair_bytes = self.metrics.counter("repair_bytes", "Bytes received after the first pass")
+        self.decrypt_seconds = self.metrics.histogram("decrypt_seconds", "Time to open one packet")
+        self.first_packet = None
+        self.last_packet = None
+        self.loss_meter = None  # set while feedback is being reported
+        self.first_pass_bytes = None
 
     def generate_rsa_keypair(self):
         self.private_key = rsa.generate_private_key(
@@ -34,100 +99,447 @@ class SecureReceiver:
         )
         self.public_key = self.private_key.public_key()
 
+    def load_keys(self):
+        if self.handshake_mode == "rsa" and self.private_key is None:
+            self.generate_rsa_keypair()
+        elif self.handshake_mode != "rsa" and self.identity is None:
+            self.identity = load_identity(RECEIVER_IDENTITY_FILE)
+            if SESSION_TICKETS:
+                self.tickets = TicketStore(RECEIVER_TICKET_FILE, TICKET_LIFETIME)
+
     def tcp_handshake(self):
-        self.generate_rsa_keypair()  # Ensure keypair is ready before handshake
         tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         tcp_sock.bind(('', self.tcp_port))  # Listen on all interfaces
         tcp_sock.listen(1)
+        self.load_keys()
         print("📥 Waiting for TCP connection...")
         conn, addr = tcp_sock.accept()
+        self.handshake_connection(conn, addr)
+        tcp_sock.close()
+
+    def handshake_connection(self, conn, addr):
+        self.load_keys()
         self.cur_ip = addr[0]  # ✅ Sender's IP
 
-        pem = self.public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-        conn.sendall(pem)
-        enc_key = conn.recv(1024)
-        self.aes_key = self.private_key.decrypt(
-            enc_key,
-            asym_padding.OAEP(
-                mgf=asym_padding.MGF1(hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
+        if self.handshake_mode == "rsa":
+            pem = self.public_key.public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo
             )
-        )
+            conn.sendall(pem)
+            enc_key = conn.recv(1024)
+            self.aes_key = self.private_key.decrypt(
+                enc_key,
+                asym_padding.OAEP(
+                    mgf=asym_padding.MGF1(hashes.SHA256()),
+                    algorithm=hashes.SHA256(),
+                    label=None
+                )
+            )
+        else:
+            self.aes_key = receiver_exchange(conn, self.identity, self.tickets)
         print("✅ AES key derived.")
-        conn.sendall(b"READY")
+        conn.sendall(b"READY " + ",".join(CIPHER_MODES).encode() + b" " + ",".join(available_codecs()).encode())
 
         metadata = conn.recv(2048).decode()
-        group_name, mcast_ip, mcast_port = metadata.split(',')
+        fields = metadata.split(',')
+        if len(fields) < 6:
+            conn.close()
+            raise ValueError("sender predates the binary manifest and repair protocol")
+        group_name, mcast_ip, mcast_port = fields[:3]
+        self.cipher = PacketCipher(self.aes_key, fields[3])
+        self.stripes = int(fields[4])
+        self.compression = fields[5]
         self.mcast_group = mcast_ip
         self.mcast_port = int(mcast_port)
         self.group_name = group_name
+        if self.claim_channel is not None:
+            self.release_channel = self.claim_channel(self.mcast_group, self.mcast_port)
+            if self.release_channel is None:
+                conn.sendall(b"BUSY")
+                conn.close()
+                raise ConnectionError(f"multicast channel {self.mcast_group}:{self.mcast_port} is busy")
+        conn.sendall(b"GO")
         conn.close()
-        tcp_sock.close()
 
-    def decrypt_message(self, packet):
-        iv = packet[:16]
-        ciphertext = packet[16:-32]
-        hash_val = packet[-32:]
-
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(iv), backend=default_backend())
-        decryptor = cipher.decryptor()
-        padded = decryptor.update(ciphertext) + decryptor.finalize()
-        unpadder = sym_padding.PKCS7(128).unpadder()
-        plaintext = unpadder.update(padded) + unpadder.finalize()
-
-        if blake2b(plaintext, digest_size=32).digest() != hash_val:
-            return None
-        return plaintext
-
-    def listen_multicast(self):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('', self.mcast_port))
-        mreq = struct.pack("4sl", socket.inet_aton(self.mcast_group), socket.INADDR_ANY)
-        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
-        
-        print("📡 Listening for multicast messages...")
+    def decrypt_message(self, seq_num, packet, kind=PACKET_DATA):
+        start = time.perf_counter()
+        msg = self.cipher.open(seq_num, packet, kind)
+        self.decrypt_seconds.observe(time.perf_counter() - start)
+        if msg is None:
+            self.decrypt_failures.inc()
+        return msg
+
+    def split_message(self, msg):
+        file_id_len = struct.unpack(">H", msg[:2])[0]
+        file_id = msg[2:2 + file_id_len].decode()
+        seq_num = struct.unpack(">I", msg[2 + file_id_len:6 + file_id_len])[0]
+        return file_id, seq_num, msg[6 + file_id_len:]
+
+    def parse_metadata(self, body):
+        file_id_len = struct.unpack(">H", body[:2])[0]
+        file_id_end = 2 + file_id_len
+        file_id = body[2:file_id_end].decode()
+        fec_block, file_size, seq_base, total, chunk_size, file_count = struct.unpack(
+            ">HQIIII", body[file_id_end:file_id_end + 26])
+        digest = body[file_id_end + 26:file_id_end + 58]
+        filename = body[file_id_end + 58:].decode()
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"unsupported chunk size {chunk_size}")
+        if total != -(-file_size // chunk_size):
+            raise ValueError(f"chunk count {total} does not match size {file_size}")
+        return file_id, fec_block, file_size, seq_base, chunk_size, file_count, digest, filename
+
+    def start_session(self):
+        self.session_id = uuid.uuid4().hex
+        self.checkpoint.save_session(self.session_id, {
+            "sender_ip": self.cur_ip,
+            "repair_port": self.repair_port,
+            "cipher_mode": self.cipher.mode,
+            "aes_key": self.aes_key,
+            "mcast_group": self.mcast_group,
+            "mcast_port": self.mcast_port,
+            "stripes": self.stripes,
+            "compression": self.compression,
+            "output_dir": self.output_dir,
+        })
+
+    def resume_session(self):
+        session, files = self.checkpoint.load_unfinished()
+        if session is None:
+            print("ℹ️ No interrupted transfer to resume.")
+            return False
+        self.session_id = session["session_id"]
+        self.cur_ip = session["sender_ip"]
+        self.repair_port = session["repair_port"]
+        self.aes_key = session["aes_key"]
+        self.cipher = PacketCipher(self.aes_key, session["cipher_mode"])
+        self.mcast_group = session["mcast_group"]
+        self.mcast_port = session["mcast_port"]
+        self.stripes = session["stripes"]
+        self.compression = session["compression"]
+        self.output_dir = session["output_dir"]
+        self.file_count = session["file_count"] or len(files)  # rows from before the column: trust the files
+        with self.lock:
+            for row in files:
+                self.open_file(row["file_id"], row["fec_block"], row["size"], row["seq_base"], row["name"],
+                               checkpoint_bits=row["bitmap"], digest=row["digest"], chunk_size=row["chunk_size"])
+        have = sum(f.received.count for f in self.files.values())
+        total = sum(f.total for f in self.files.values())
+        print(f"♻️ Resuming transfer from {self.cur_ip}: {have}/{total} packets already on disk")
+        return True
+
+    def save_checkpoint(self):
+        # Snapshot the bitmaps first, then flush the data they describe, then record them
+        with self.lock:
+            progress = [(f.file_id, bytes(f.received.bits), f.received.count)
+                        for f in self.files.values() if f.received.count != f.saved_count]
+            sinks = [self.files[file_id].sink for file_id, _, _ in progress]
+        if not progress:
+            return
+        for sink in sinks:
+            sink.sync()
+        self.checkpoint.save_progress(progress)
+        for file_id, _, count in progress:
+            self.files[file_id].saved_count = count
+
+    def checkpoint_loop(self):
+        while not self.stop_receiving.wait(CHECKPOINT_INTERVAL):
+            try:
+                self.save_checkpoint()
+            except Exception as e:
+                print(f"⚠️ Checkpoint failed: {e}")
+
+    def open_file(self, file_id, fec_block, file_size, seq_base, filename, checkpoint_bits=None, digest=None,
+                  chunk_size=None):
+        incoming = IncomingFile(file_id, filename, file_size, seq_base, fec_block, self.output_dir,
+                                checkpoint_bits, digest, chunk_size or CHUNK_SIZE)
+        if self.session_id:
+            self.checkpoint.save_file(self.session_id, incoming)
+        self.files[file_id] = incoming
+        self.by_base = sorted(self.files.values(), key=lambda f: f.seq_base)
+        self.bases = [f.seq_base for f in self.by_base]
+        pending, self.pending = self.pending, {}
+        for seq, msg in pending.items():
+            self._store_packet(seq, msg)
+        return incoming
+
+    def file_for_seq(self, seq_num):
+        return find_owner(self.by_base, self.bases, seq_num)
+
+    def store_packet(self, seq_num, msg):
+        with self.lock:
+            self._store_packet(seq_num, msg)
+
+    def _store_packet(self, seq_num, msg):
+        incoming = self.file_for_seq(seq_num)
+        if incoming is None:
+            # Its metadata has not arrived yet; keep a bounded number around
+            if len(self.pending) < PENDING_PACKET_LIMIT:
+                self.pending[seq_num] = msg
+            return
+        file_id, seq, payload = self.split_message(msg)
+        if file_id != incoming.file_id or seq != seq_num:
+            return
+        if self.compression != "none":
+            payload = unpack_chunk(payload, incoming.chunk_size)
+            if payload is None:
+                return
+        if not incoming.write(seq_num, payload):
+            return
+        if incoming.received.count == incoming.total:
+            self.check_all_received()
+        if incoming.fec:
+            for seq, recovered in incoming.fec.add_data(seq_num, msg):
+                self.store_recovered(seq, recovered)
+
+    def check_all_received(self):
+        # Every file the manifests announced is complete: no need to wait for EOF
+        if self.session_complete():
+            self.multicast_done.set()
+
+    def session_complete(self):
+        # A file whose every manifest was lost is not in self.files at all, so
+        # completeness also needs as many files as the manifests announced
+        return (self.file_count and len(self.files) >= self.file_count and
+                all(f.complete() for f in self.files.values()))
+
+    def store_recovered(self, seq_num, msg):
+        incoming = self.file_for_seq(seq_num)
+        if incoming is None or (seq_num - incoming.seq_base) in incoming.received:
+            return
+        self._store_packet(seq_num, msg)
+        print(f"🧩 Rebuilt packet {seq_num} from parity")
+
+    def have_packet(self, seq_num):
+        with self.lock:
+            incoming = self.file_for_seq(seq_num)
+            return incoming is not None and (seq_num - incoming.seq_base) in incoming.received
+
+    def handle_datagram(self, data):
+        # Manifests are repeated during the transfer; only the first copy opens the file
+        if data.startswith(METADATA_MAGIC):
+            seq_base = int.from_bytes(data[4:8], 'big')
+            body = self.decrypt_message(seq_base, data[8:], PACKET_MANIFEST)
+            if not body:
+                return
+            try:
+                file_id, fec_block, file_size, seq_base, chunk_size, file_count, digest, filename = \
+                    self.parse_metadata(body)
+                with self.lock:
+                    if file_count > self.file_count:
+                        self.file_count = file_count
+                        if self.session_id:
+                            self.checkpoint.save_file_count(self.session_id, file_count)
+                    if file_id in self.files:
+                        return
+                    self.open_file(file_id, fec_block, file_size, seq_base, filename, digest=digest,
+                                   chunk_size=chunk_size)
+                    self.check_all_received()  # covers empty files
+                print(f"ℹ️ Received metadata: file_id={file_id}, filename={filename}, size={file_size}")
+            except Exception as e:
+                print(f"❌ Failed to parse metadata: {e}")
+            return
+
+        if data.startswith(FEC_MAGIC):
+            block_index = int.from_bytes(data[4:8], 'big')
+            body = self.decrypt_message(block_index, data[8:], PACKET_PARITY)
+            if not body:
+                return
+            with self.lock:
+                incoming = self.file_for_seq(PARITY_HEADER.unpack_from(body)[0])
+                if incoming and incoming.fec:
+                    for seq, msg in incoming.fec.add_parity(block_index, body):
+                        self.store_recovered(seq, msg)
+            return
+
+        if data.startswith(DELTA_MAGIC):
+            seq_num = int.from_bytes(data[4:8], 'big')
+            digests = self.decrypt_message(seq_num, data[8:], PACKET_RECIPE)
+            if not digests:
+                return
+            with self.lock:
+                incoming = self.file_for_seq(seq_num)
+                if incoming:
+                    incoming.add_recipe(seq_num - incoming.seq_base, digests)
+            return
+
+        seq_num = int.from_bytes(data[:4], 'big')
+        if self.have_packet(seq_num):
+            self.duplicates.inc()
+            return  # duplicate, e.g. from a multicast repair round another receiver asked for
+        msg = self.decrypt_message(seq_num, data[4:])
+        if msg:
+            self.store_packet(seq_num, msg)
+        else:
+            print(f"❌ Failed to decrypt packet {seq_num}")
+
+    def decrypt_worker(self, inbox):
+        # AES and blake2b release the GIL, so several of these run in parallel
         while True:
-            data, _ = sock.recvfrom(20480)
-            
-            if data == b"EOF":
-                print("🛑 Transmission complete.")
-                break
-            # Check for metadata
-            if data.startswith(METADATA_MAGIC):
-                try:
-                    file_id_len = struct.unpack(">H", data[4:6])[0]
-                    file_id_end = 6 + file_id_len
-                    file_id = data[6:file_id_end].decode()
-                    filename = data[file_id_end:].decode()
-                    self.file_id = file_id
-                    self.filename = filename
-                    print(f"ℹ️ Received metadata: file_id={file_id}, filename={filename}")
-                except Exception as e:
-                    print(f"❌ Failed to parse metadata: {e}")
+            data = inbox.get()
+            try:
+                if data is None:
+                    break
+                self.handle_datagram(data)
+            except Exception as e:
+                print(f"❌ Dropped malformed packet: {e}")
+            finally:
+                inbox.task_done()
+
+    def open_multicast_socket(self, port):
+        if self.socket_pool is not None:
+            return self.socket_pool.take(self.mcast_group, port)
+        return open_multicast_socket(self.mcast_group, port)
+
+    def release_multicast_socket(self, sock):
+        if self.socket_pool is not None:
+            self.socket_pool.give(self.mcast_group, sock)
+        else:
+            sock.close()
+
+    def receive_loop(self, sock):
+        # This loop only drains the socket; all parsing happens on the workers.
+        # It keeps running after EOF so multicast repair rounds are picked up too.
+        batches = DatagramReceiver(sock, IO_BATCH_SIZE)
+        seen_eof = False
+        while not self.stop_receiving.is_set():
+            try:
+                batch = batches.recv()
+            except socket.timeout:
                 continue
-            
-            seq_num = int.from_bytes(data[:4], 'big')
-            packet = data[4:]
-            msg = self.decrypt_message(packet)
-            if msg:
-                self.received_packets[seq_num] = msg
-                print(f"✅ Received packet {seq_num}")
-            else:
-                print(f"❌ Failed to decrypt packet {seq_num}")
+            self.last_packet = time.perf_counter()
+            if self.first_packet is None:
+                self.first_packet = self.last_packet
+            self.datagrams.inc(len(batch))
+            self.bytes_received.inc(sum(len(data) for data in batch))
+            meter = self.loss_meter
+            for data in batch:
+                if data == b"EOF":
+                    if not seen_eof:
+                        seen_eof = True
+                        self.stripe_eof()
+                    continue
+                if meter is not None and data[:4] not in CONTROL_MAGICS:
+                    meter.observe(int.from_bytes(data[:4], 'big'))
+                self.inbox.put(data)
+        self.release_multicast_socket(sock)
 
-        sock.close()
+    def stripe_eof(self):
+        with self.lock:
+            self.eofs += 1
+            if self.eofs == self.stripes:
+                self.multicast_done.set()
+
+    def drain_inbox(self):
+        self.inbox.join()
+
+    def listen_multicast(self, wait_for_eof=True):
+        self.inbox = queue.Queue(maxsize=RECEIVE_QUEUE_LIMIT)
+        self.stop_receiving = threading.Event()
+        self.multicast_done.clear()
+        self.first_pass_over.clear()
+        self.eofs = 0
+        self.decrypt_workers = [threading.Thread(target=self.decrypt_worker, args=(self.inbox,), daemon=True)
+                                for _ in range(self.workers)]
+        for worker in self.decrypt_workers:
+            worker.start()
+        self.checkpointer = threading.Thread(target=self.checkpoint_loop, daemon=True)
+        self.checkpointer.start()
+
+        # One socket and receive thread per stripe; the first pass ends once every stripe sent EOF
+        sockets = [self.open_multicast_socket(self.mcast_port + k) for k in range(self.stripes)]
+        self.receive_threads = [threading.Thread(target=self.receive_loop, args=(sock,), daemon=True)
+                                for sock in sockets]
+        print("📡 Listening for multicast messages...")
+        for receiver in self.receive_threads:
+            receiver.start()
+        if not wait_for_eof:
+            return  # resuming: the first pass may be long over, go straight to repair
+        if CONGESTION_CONTROL and self.stripes == 1:
+            self.loss_meter = LossMeter()
+            threading.Thread(target=self.feedback_loop, daemon=True).start()
+        try:
+            self.wait_first_pass()
+        finally:
+            self.first_pass_over.set()
+        self.drain_inbox()
+        print("🛑 Transmission complete.")
+        self.reuse_local_copies()
+
+        received = sum(f.received.count for f in self.files.values())
+        expected = sum(f.total for f in self.files.values())
+        print(f"📦 Received {received}/{expected} packets across {len(self.files)} file(s)")
+        self.first_pass_bytes = self.bytes_received.value
+        self.metrics.gauge("first_pass_packets", "Chunks held when the first pass ended").set(received)
+        self.metrics.gauge("loss_rate", "Share of chunks missing after the first pass").set(
+            1 - received / expected if expected else 0.0)
+        recovered = sum(f.fec.recovered for f in self.files.values() if f.fec)
+        if recovered:
+            print(f"🧩 Rebuilt {recovered} packets locally with FEC")
+
+    def reuse_local_copies(self):
+        with self.lock:
+            reused = sum(f.reuse_local_chunks() for f in self.files.values())
+        if reused:
+            print(f"🔀 Reused {reused} unchanged chunks from existing copies")
+
+    def feedback_loop(self):
+        # Reports loss and queue fill to the sender's repair server until the first pass ends
+        sock = None
+        try:
+            while not self.first_pass_over.wait(FEEDBACK_INTERVAL):
+                if sock is None:
+                    try:
+                        sock = socket.create_connection((self.cur_ip, self.repair_port), timeout=1)
+                    except OSError:
+                        continue
+                queue_fill = self.inbox.qsize() / RECEIVE_QUEUE_LIMIT
+                send_frame(sock, FEEDBACK_MAGIC + FEEDBACK.pack(self.loss_meter.sample(), queue_fill))
+        except OSError as e:
+            print(f"⚠️ Feedback to sender stopped: {e}")
+        finally:
+            self.loss_meter = None
+            if sock is not None:
+                sock.close()
 
-        # Infer total packets
-        self.expected_total = max(self.received_packets.keys(), default=0)
+    def wait_first_pass(self):
+        # Ends on EOF from every stripe, once every announced file is complete, or after
+        # MULTICAST_IDLE_TIMEOUT without traffic, so a lost EOF cannot stall the receiver.
+        # Until the first packet the clock runs from here, with MULTICAST_FIRST_PACKET_TIMEOUT,
+        # so a sender that never starts cannot hold the receiver (or its channel) forever.
+        started = time.perf_counter()
+        while not self.multicast_done.wait(0.5):
+            if self.last_packet is None:
+                if time.perf_counter() - started > MULTICAST_FIRST_PACKET_TIMEOUT:
+                    print(f"⏱️ Nothing from the sender within {MULTICAST_FIRST_PACKET_TIMEOUT}s; giving up on it")
+                    return
+            elif time.perf_counter() - self.last_packet > MULTICAST_IDLE_TIMEOUT:
+                print(f"⏱️ No multicast traffic for {MULTICAST_IDLE_TIMEOUT}s; ending the first pass")
+                return
 
-    def request_missing(self, max_retries=5, retry_delay=2):
-        missing = [str(i) for i in range(1, self.expected_total + 1) if i not in self.received_packets]
+    def close_multicast(self):
+        self.stop_receiving.set()
+        for receiver in self.receive_threads:
+            receiver.join()
+        for _ in self.decrypt_workers:
+            self.inbox.put(None)
+        for worker in self.decrypt_workers:
+            worker.join()
+        self.checkpointer.join()
+        self.save_checkpoint()
+        self.leave_channel()
+
+    def leave_channel(self):
+        release, self.release_channel = self.release_channel, None
+        if release is not None:
+            release()
+
+    def request_missing(self, max_retries=5, retry_delay=2, max_rounds=REPAIR_MAX_ROUNDS):
+        if not self.files:
+            print("❌ No metadata received; nothing to repair.")
+            return
 
         retries = 0
         while retries < max_retries:
@@ -144,53 +556,140 @@ class SecureReceiver:
             print("❌ Could not connect to repair server after several attempts.")
             return
 
-        if not missing:
-            print("✅ All packets received.")
-            sock.sendall(b"COMPLETE")
-            sock.close()
-            return
-
-        print(f"🔁 Requesting missing packets: {missing}")
+        # Several NACK rounds share one connection; each round ends with an empty frame.
+        # A multicast round waits for the aggregation window and the paced resend.
+        sock.settimeout(REPAIR_MAX_SECONDS)
         try:
-            sock.sendall(','.join(missing).encode())
-            while True:
-                data = sock.recv(20480)
-                if not data:
-                    break
-                seq_num = int.from_bytes(data[:4], 'big')
-                packet = data[4:]
-                msg = self.decrypt_message(packet)
-                if msg:
-                    print(f"🛠️ Recovered {seq_num}")
-                    self.received_packets[seq_num] = msg
+            for round_no in range(1, max_rounds + 1):
+                lost = self.file_count - len(self.files)
+                if lost > 0:
+                    # Every copy of some manifest was lost: the sender re-sends them all
+                    print(f"🔁 Round {round_no}: asking again for {lost} lost file manifest(s)")
+                    send_frame(sock, b"MANIFESTS")
+                    if not self.read_repairs(sock):
+                        break  # server closed the session
+                incomplete = [f for f in self.files.values() if not f.complete()]
+                if not incomplete:
+                    if self.session_complete():
+                        break
+                    continue
+                missing = sum(f.total - f.received.count for f in incomplete)
+                print(f"🔁 Round {round_no}: requesting {missing} missing packets across {len(incomplete)} file(s)")
+                self.repair_rounds.inc()
+                closed = False
+                for i in range(0, len(incomplete), NACK_MAX_SECTIONS):
+                    batch = incomplete[i:i + NACK_MAX_SECTIONS]
+                    send_frame(sock, b"".join(encode_nack(f.received, f.seq_base) for f in batch))
+                    if not self.read_repairs(sock):
+                        closed = True
+                        break
+                if closed:
+                    break  # server closed the session
+                # Multicast repairs may still be in flight or queued for the workers
+                time.sleep(MULTICAST_SETTLE)
+                self.drain_inbox()
+
+            if self.session_complete():
+                print("✅ All packets received.")
+                send_frame(sock, b"COMPLETE")
+            elif len(self.files) < self.file_count:
+                print(f"❌ {self.file_count - len(self.files)} file(s) never announced themselves after repair.")
+                send_frame(sock, b"GIVEUP")
+            else:
+                print("❌ Some packets are still missing after repair.")
+                send_frame(sock, b"GIVEUP")
         except Exception as e:
             print(f"❌ Error during repair session: {e}")
         finally:
             sock.close()
 
-    def write_file(self, output_dir="./received_files/"):
-        if not self.filename:
+    def read_repairs(self, sock):
+        # Reads one round's frames up to the empty one that ends it; False once the server has closed
+        while True:
+            data = recv_frame(sock)
+            if data is None:
+                return False
+            if not data:
+                return True
+            self.repair_bytes.inc(len(data))
+            if data.startswith(METADATA_MAGIC):
+                self.handle_datagram(data)
+                continue
+            seq_num = int.from_bytes(data[:4], 'big')
+            msg = self.decrypt_message(seq_num, data[4:])
+            if msg:
+                self.store_packet(seq_num, msg)
+
+    def write_file(self):
+        if not self.files:
             raise ValueError("❌ Cannot write file: filename not set from metadata.")
 
-        os.makedirs(output_dir, exist_ok=True)  # Ensure output dir exists
-        output_path = os.path.join(output_dir, self.filename)
-
-        with open(output_path, "wb") as f:
-            for seq in sorted(self.received_packets):
-                header_len = 2 + len(self.file_id.encode()) + 4
-                f.write(self.received_packets[seq][header_len:])
-        print(f"💾 File written to {output_path}")
-         
-    def run(self):
-        self.generate_rsa_keypair()
-        self.tcp_handshake()
-        self.listen_multicast()
+        for incoming in self.files.values():
+            if incoming.complete() and not incoming.verify():
+                incoming.sink.close()
+                print(f"❌ {incoming.name} does not match the sender's hash; kept at {incoming.sink.part_path}")
+                continue
+            if not incoming.complete():
+                # Never replace an existing copy with a holey one; the .part file
+                # and the checkpoint stay so --resume can finish it
+                incoming.sink.close()
+                print(f"⚠️ {incoming.name} is missing {incoming.total - incoming.received.count} chunks; "
+                      f"kept at {incoming.sink.part_path} for --resume")
+                continue
+            output_path = incoming.finish()
+            print(f"💾 File written to {output_path}")
+
+    def export_metrics(self):
+        recovered = sum(f.fec.recovered for f in self.files.values() if f.fec)
+        payload = sum(f.size for f in self.files.values() if f.complete())
+        self.metrics.gauge("fec_recovered", "Chunks rebuilt from parity").set(recovered)
+        self.metrics.gauge("chunks_received", "Chunks held at the end").set(
+            sum(f.received.count for f in self.files.values()))
+        self.metrics.gauge("chunks_expected", "Chunks announced by metadata").set(
+            sum(f.total for f in self.files.values()))
+        self.metrics.gauge("payload_bytes", "Bytes of completed files").set(payload)
+        if self.first_pass_bytes is not None:
+            self.repair_bytes.inc(self.bytes_received.value - self.first_pass_bytes)  # multicast repair rounds
+        if self.first_packet is not None:
+            elapsed = time.perf_counter() - self.first_packet
+            self.metrics.gauge("transfer_seconds", "First datagram to files written").set(elapsed)
+            self.metrics.gauge("goodput_mbps", "File bits per second, end to end").set(payload * 8 / elapsed / 1e6)
+        path = self.metrics.export(METRICS_DIR, METRICS_PROMETHEUS, self.session_id)
+        print(f"📊 Metrics written to {path}")
+
+    def run(self, resume=False):
+        if resume and self.resume_session():
+            self.listen_multicast(wait_for_eof=False)
+        else:
+            self.tcp_handshake()
+            self.start_session()
+            self.listen_multicast()
+        self.finish_transfer()
+
+    def finish_transfer(self):
         self.request_missing()
+        self.close_multicast()
+        if not self.files:
+            # The sender never started; nothing to write and nothing to resume
+            self.checkpoint.drop_session(self.session_id)
+            print("❌ Nothing was received from the sender; no files written.")
+            self.export_metrics()
+            return
         self.write_file()
+        if self.session_complete():
+            self.checkpoint.drop_session(self.session_id)
+        elif len(self.files) < self.file_count:
+            print(f"⚠️ {self.file_count - len(self.files)} of {self.file_count} file(s) never arrived; "
+                  f"the session is kept for --resume")
+        self.export_metrics()
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Multicast Receiver Service")
     parser.add_argument("--reset", action="store_true", help="Reset saved configuration")
     parser.add_argument("--config", type=str, help="Path to custom config file")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the last interrupted transfer. Only works while the sender is still serving "
+                             f"repairs: it waits up to {REPAIR_RESUME_GRACE}s for a receiver that dropped its "
+                             "connection, so restart within that window")
 
     args = parser.parse_args()
     zeroconf = Zeroconf(interfaces=InterfaceChoice.All)
@@ -205,4 +704,4 @@ if __name__ == "__main__":
         config = prompt_user_for_config(config_path)
 
     main(zeroconf,config)
-    SecureReceiver(tcp_port=config["port"]).run()
+    SecureReceiver(tcp_port=config["port"]).run(resume=args.resume)
@@ -0,0 +1,153 @@
+import os
+import sys
+import ctypes
+import select
+import socket
+
+# sendmmsg/recvmmsg move a whole batch of datagrams per syscall. Python's
+# socket module does not wrap them, so they are called through libc on Linux;
+# everywhere else the classes below fall back to one sendto/recvfrom each.
+MSG_WAITFORONE = 0x10000
+
+
+class _iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _msghdr), ("msg_len", ctypes.c_uint)]
+
+
+class _sockaddr_in(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_uint8 * 4),
+        ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_mmsghdr), ctypes.c_uint, ctypes.c_int]
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def batching_available():
+    return _libc is not None
+
+
+def _raise_errno():
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err))
+
+
+class DatagramSender:
+    def __init__(self, sock, dest, batch_size=32):
+        self.sock = sock
+        self.dest = dest
+        self.batch_size = batch_size
+        self.batch = []
+        self.syscalls = 0
+        self.use_mmsg = _libc is not None and batch_size > 1 and sock.family == socket.AF_INET
+        if self.use_mmsg:
+            self.addr = _sockaddr_in(socket.AF_INET, socket.htons(dest[1]),
+                                     (ctypes.c_uint8 * 4)(*socket.inet_aton(dest[0])))
+            self.iovecs = (_iovec * batch_size)()
+            self.msgs = (_mmsghdr * batch_size)()
+            for i in range(batch_size):
+                hdr = self.msgs[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self.addr)
+                hdr.msg_namelen = ctypes.sizeof(self.addr)
+                hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                hdr.msg_iovlen = 1
+
+    def send(self, packet):
+        self.batch.append(packet)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        if not self.use_mmsg:
+            for packet in self.batch:
+                self.sock.sendto(packet, self.dest)
+                self.syscalls += 1
+            self.batch = []
+            return
+
+        # self.batch keeps the bytes objects alive while the kernel reads them
+        for i, packet in enumerate(self.batch):
+            self.iovecs[i].iov_base = ctypes.cast(ctypes.c_char_p(packet), ctypes.c_void_p)
+            self.iovecs[i].iov_len = len(packet)
+        sent = 0
+        while sent < len(self.batch):
+            n = _libc.sendmmsg(self.sock.fileno(), ctypes.byref(self.msgs[sent]), len(self.batch) - sent, 0)
+            self.syscalls += 1
+            if n < 0:
+                if ctypes.get_errno() in (4, 11):  # EINTR, EAGAIN
+                    continue
+                _raise_errno()
+            sent += n
+        self.batch = []
+
+
+class DatagramReceiver:
+    def __init__(self, sock, batch_size=32, bufsize=20480):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.bufsize = bufsize
+        self.syscalls = 0
+        self.use_mmsg = _libc is not None and batch_size > 1
+        if self.use_mmsg:
+            self.buffers = [ctypes.create_string_buffer(bufsize) for _ in range(batch_size)]
+            self.iovecs = (_iovec * batch_size)()
+            self.msgs = (_mmsghdr * batch_size)()
+            for i, buf in enumerate(self.buffers):
+                self.iovecs[i].iov_base = ctypes.addressof(buf)
+                self.iovecs[i].iov_len = bufsize
+                self.msgs[i].msg_hdr.msg_iov = ctypes.pointer(self.iovecs[i])
+                self.msgs[i].msg_hdr.msg_iovlen = 1
+
+    def recv(self):
+        # Returns at least one datagram; honours the socket timeout like recvfrom
+        if not self.use_mmsg:
+            data, _ = self.sock.recvfrom(self.bufsize)
+            self.syscalls += 1
+            return [data]
+
+        timeout = self.sock.gettimeout()
+        while True:
+            if timeout is not None:
+                ready, _, _ = select.select([self.sock], [], [], timeout)
+                if not ready:
+                    raise socket.timeout("timed out")
+            n = _libc.recvmmsg(self.sock.fileno(), self.msgs, self.batch_size, MSG_WAITFORONE, None)
+            self.syscalls += 1
+            if n >= 0:
+                break
+            if ctypes.get_errno() not in (4, 11):  # EINTR, EAGAIN
+                _raise_errno()
+        return [ctypes.string_at(self.buffers[i], self.msgs[i].msg_len) for i in range(n)]
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config import CHUNK_SIZE
+from packet_crypto import PacketCipher, CIPHER_MODES
+
+
+def bench_mode(mode, payload_size, count):
+    cipher = PacketCipher(os.urandom(32), mode)
+    payload = os.urandom(payload_size)
+
+    start = time.perf_counter()
+    sealed = [cipher.seal(seq, payload) for seq in range(count)]
+    seal_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for seq, body in enumerate(sealed):
+        cipher.open(seq, body)
+    open_time = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "overhead": len(sealed[0]) - payload_size,
+        "seal_us": seal_time / count * 1e6,
+        "open_us": open_time / count * 1e6,
+        "seal_mbps": payload_size * count / seal_time / 1e6,
+        "open_mbps": payload_size * count / open_time / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-packet cost of each packet cipher mode")
+    parser.add_argument("--size", type=int, default=CHUNK_SIZE, help="Plaintext bytes per packet")
+    parser.add_argument("--count", type=int, default=20000, help="Packets per mode")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'overhead B':>12}{'seal µs':>10}{'open µs':>10}{'seal MB/s':>12}{'open MB/s':>12}")
+    for mode in CIPHER_MODES:
+        r = bench_mode(mode, args.size, args.count)
+        print(f"{r['mode']:<10}{r['overhead']:>12}{r['seal_us']:>10.2f}{r['open_us']:>10.2f}"
+              f"{r['seal_mbps']:>12.0f}{r['open_mbps']:>12.0f}")
@@ -0,0 +1,220 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from config import CHUNK_SIZE
+from secr import SecureSender
+from Secure_Receiver import SecureReceiver
+from packet_crypto import PacketCipher, PACKET_MANIFEST
+from transfer_files import IncomingFile
+
+# Offline microbenchmarks for the per-packet hot paths. Every case is timed
+# best-of-N, then run once more under tracemalloc for its peak allocation.
+# Results go to JSON so two commits can be compared with --compare.
+
+FILE_ID = "6f1c2a4e-8b1d-4c55-9a0e-3f1d2b7c9e10"
+
+
+def measure(fn, ops, nbytes, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ops": ops,
+        "seconds": best,
+        "ops_per_sec": ops / best,
+        "mb_per_sec": nbytes / best / 1e6,
+        "peak_alloc_kib": peak / 1024,
+    }
+
+
+def make_endpoints(mode):
+    sender = SecureSender(cipher_mode=mode)
+    receiver = SecureReceiver()
+    receiver.cipher = PacketCipher(sender.aes_key, mode)
+    return sender, receiver
+
+
+def bench_encrypt(sender, chunk_size, count, repeat):
+    messages = [sender.build_message(FILE_ID, seq, os.urandom(chunk_size)) for seq in range(count)]
+
+    def run():
+        for seq, msg in enumerate(messages):
+            sender.encrypt_packet(seq, msg)
+    return measure(run, count, chunk_size * count, repeat)
+
+
+def bench_decrypt(sender, receiver, chunk_size, count, repeat):
+    packets = [sender.build_packet(FILE_ID, seq, os.urandom(chunk_size)) for seq in range(count)]
+
+    def run():
+        for seq, packet in enumerate(packets):
+            receiver.decrypt_message(seq, packet[4:])
+    return measure(run, count, chunk_size * count, repeat)
+
+
+def bench_headers(sender, receiver, chunk_size, count, repeat):
+    chunk = os.urandom(chunk_size)
+
+    def run():
+        for seq in range(count):
+            receiver.split_message(sender.build_message(FILE_ID, seq, chunk))
+    return measure(run, count, chunk_size * count, repeat)
+
+
+def bench_metadata(sender, receiver, count, repeat):
+    class Meta:
+        file_id = FILE_ID
+        name = "exports/orders-2024-05-01.csv"
+        size = 512 * 1024 * 1024
+        seq_base = 1024
+        chunk_size = CHUNK_SIZE
+        total = -(-size // CHUNK_SIZE)
+        digest = bytes(32)
+
+    sender.files = [Meta]
+    packet = sender.build_manifest(Meta)
+
+    def run():
+        for _ in range(count):
+            packet = sender.build_manifest(Meta)
+            receiver.parse_metadata(receiver.decrypt_message(Meta.seq_base, packet[8:], PACKET_MANIFEST))
+    return measure(run, count, len(packet) * count, repeat)
+
+
+def bench_chunk_file(sender, path, file_size, chunk_size, repeat):
+    count = -(-file_size // chunk_size)
+
+    def run():
+        for _ in sender.chunk_file(path, chunk_size):
+            pass
+    return measure(run, count, file_size, repeat)
+
+
+def bench_write_file(receiver, workdir, file_size, repeat):
+    # Positional writes of every chunk into the .part file, then write_file's
+    # fsync and rename; chunks go in reverse order to defeat any append fast path
+    count = -(-file_size // CHUNK_SIZE)
+    chunks = [os.urandom(min(CHUNK_SIZE, file_size - i * CHUNK_SIZE)) for i in range(count)]
+
+    def run():
+        receiver.files = {FILE_ID: IncomingFile(FILE_ID, "bench.bin", file_size, 0, 0, workdir)}
+        incoming = receiver.files[FILE_ID]
+        for seq in range(count - 1, -1, -1):
+            incoming.write(seq, chunks[seq])
+        with redirect_stdout(io.StringIO()):
+            receiver.write_file()
+    return measure(run, count, file_size, repeat)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args, workdir):
+    results = []
+
+    def record(name, params, result):
+        result.update(name=name, **params)
+        results.append(result)
+        label = " ".join(f"{k}={v}" for k, v in params.items())
+        print(f"{name:<14}{label:<34}{result['ops_per_sec']:>12.0f}{result['mb_per_sec']:>10.0f}"
+              f"{result['peak_alloc_kib']:>12.1f}")
+
+    print(f"{'case':<14}{'params':<34}{'ops/s':>12}{'MB/s':>10}{'peak KiB':>12}")
+    for mode in args.modes:
+        sender, receiver = make_endpoints(mode)
+        for chunk_size in args.chunk_sizes:
+            params = {"mode": mode, "chunk": chunk_size}
+            record("encrypt", params, bench_encrypt(sender, chunk_size, args.count, args.repeat))
+            record("decrypt", params, bench_decrypt(sender, receiver, chunk_size, args.count, args.repeat))
+
+    sender, receiver = make_endpoints(args.modes[0])
+    for chunk_size in args.chunk_sizes:
+        record("headers", {"chunk": chunk_size}, bench_headers(sender, receiver, chunk_size, args.count,
+                                                                  args.repeat))
+    record("metadata", {}, bench_metadata(sender, receiver, args.count, args.repeat))
+
+    for file_size in args.file_sizes:
+        path = os.path.join(workdir, f"source-{file_size}.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(file_size))
+        for chunk_size in args.chunk_sizes:
+            record("chunk_file", {"file": file_size, "chunk": chunk_size},
+                   bench_chunk_file(sender, path, file_size, chunk_size, args.repeat))
+        record("write_file", {"file": file_size, "chunk": CHUNK_SIZE},
+               bench_write_file(receiver, workdir, file_size, args.repeat))
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = {(r["name"], r.get("mode"), r.get("chunk"), r.get("file")): r for r in baseline["results"]}
+    print(f"\nAgainst {baseline_path} ({baseline['meta'].get('commit')}):")
+    for r in results:
+        before = old.get((r["name"], r.get("mode"), r.get("chunk"), r.get("file")))
+        if before:
+            change = (r["ops_per_sec"] / before["ops_per_sec"] - 1) * 100
+            label = " ".join(str(r[k]) for k in ("mode", "chunk", "file") if k in r)
+            print(f"{r['name']:<14}{label:<34}{change:>+10.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packet-path microbenchmarks")
+    parser.add_argument("--modes", nargs="+", default=["gcm", "chacha20", "cbc"], help="Cipher modes")
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[1024, 4096, CHUNK_SIZE],
+                        help="Plaintext bytes per packet")
+    parser.add_argument("--file-sizes", nargs="+", type=int, default=[1 << 20, 16 << 20],
+                        help="File sizes for chunk_file and write_file")
+    parser.add_argument("--count", type=int, default=5000, help="Packets per packet-level case")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the best is kept")
+    parser.add_argument("--output", default="bench_packet_path.json", help="Where to save the JSON results")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # keeps the receiver's checkpoint store out of the tree
+        results = run_suite(args, workdir)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} results to {output}")
+    if baseline:
+        compare(results, baseline)
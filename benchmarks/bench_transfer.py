@@ -0,0 +1,114 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from secr import SecureSender
+from Secure_Receiver import SecureReceiver
+from packet_crypto import PacketCipher
+from helpers import get_current_ip
+from udp_relay import LossProfile, LossyRelay
+
+# One sender and one receiver in this process with a LossyRelay between them
+# on loopback: measures goodput and how much repair a given loss pattern costs.
+# The same --seed gives the same loss pattern on every run.
+
+
+def run_transfer(args, workdir):
+    source = os.path.join(workdir, "source.bin")
+    with open(source, "wb") as f:
+        f.write(os.urandom(args.size))
+
+    sender = SecureSender(rate_mbps=args.rate, fec_block=args.fec, stripes=args.stripes)
+    sender.mcast_port = args.in_port
+    sender.repair_port = args.repair_port
+    receiver = SecureReceiver(mcast_port=args.out_port, repair_port=args.repair_port,
+                              output_dir=os.path.join(workdir, "out"))
+    receiver.aes_key = sender.aes_key
+    receiver.cipher = PacketCipher(sender.aes_key, sender.cipher_mode)
+    receiver.stripes = sender.stripes
+    receiver.cur_ip = get_current_ip()
+    sender.receivers.append(receiver.cur_ip)
+
+    profile = LossProfile(args.loss, args.burst_rate, args.burst_length, args.reorder, args.reorder_delay,
+                          args.duplicate, args.delay, args.jitter, args.seed)
+    relay = LossyRelay(sender.mcast_group, args.in_port, args.out_port, args.stripes, profile).start()
+
+    log = io.StringIO()
+    with redirect_stdout(log):
+        sender.start_repair_server()
+        repair = sender.repair_server
+        listener = threading.Thread(target=receiver.listen_multicast)
+        listener.start()
+        time.sleep(0.3)
+        start = time.perf_counter()
+        sender.send_multicast(source)
+        first_pass = time.perf_counter() - start
+        listener.join()
+        first_pass_received = sum(f.received.count for f in receiver.files.values())
+        repairer = threading.Thread(target=sender.handle_repair)
+        repairer.start()
+        receiver.request_missing()
+        elapsed = time.perf_counter() - start
+        receiver.close_multicast()
+        receiver.write_file()
+        repairer.join()
+    relay.stop()
+
+    with open(source, "rb") as f, open(os.path.join(workdir, "out", "source.bin"), "rb") as g:
+        intact = f.read() == g.read()
+    chunks = sum(f.total for f in receiver.files.values())
+    recovered = sum(f.fec.recovered for f in receiver.files.values() if f.fec)
+    return {
+        "intact": intact,
+        "chunks": chunks,
+        "first_pass_seconds": first_pass,
+        "seconds": elapsed,
+        "goodput_mbps": args.size * 8 / elapsed / 1e6,
+        "first_pass_delivery": first_pass_received / chunks if chunks else 1.0,
+        "fec_recovered": recovered,
+        "repair_rounds": repair.rounds,
+        "packets_resent": repair.packets_resent,
+        "resend_ratio": repair.packets_resent / chunks if chunks else 0.0,
+        "relay": relay.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transfer speed and repair cost through a lossy relay")
+    parser.add_argument("--size", type=int, default=8 << 20, help="Bytes to transfer")
+    parser.add_argument("--rate", type=float, default=200, help="Sender rate in Mbit/s")
+    parser.add_argument("--fec", type=int, default=0, help="FEC block size, 0 for none")
+    parser.add_argument("--stripes", type=int, default=1)
+    parser.add_argument("--loss", type=float, default=0.01)
+    parser.add_argument("--burst-rate", type=float, default=0.0)
+    parser.add_argument("--burst-length", type=float, default=4.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--reorder-delay", type=float, default=0.002)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--in-port", type=int, default=15007, help="Port the sender multicasts to")
+    parser.add_argument("--out-port", type=int, default=16007, help="Port the receiver listens on")
+    parser.add_argument("--repair-port", type=int, default=15999)
+    parser.add_argument("--output", help="Save the result as JSON")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # keeps the receiver's checkpoint store out of the tree
+        result = run_transfer(args, workdir)
+    result["args"] = vars(args)
+
+    print(json.dumps({k: v for k, v in result.items() if k != "args"}, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
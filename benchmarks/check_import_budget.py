@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from ast import literal_eval
+
+# Startup check for the group_mgmnt CLI: imports its entry module in a fresh
+# interpreter, fails if the transfer or discovery stacks come along, and fails
+# if the import takes longer than the budget (best of several runs, so a busy
+# machine does not trip it). Exits non-zero on either, for CI or a kiosk build.
+
+GROUP_MGMNT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "group_mgmnt"))
+
+# Only loaded once a send or receive is chosen from the dashboard
+DEFERRED = ("secr", "Secure_Receiver", "discovery_ui", "ui_helpers", "cryptography", "zeroconf", "prompt_toolkit")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(repr((elapsed, sorted(m for m in {deferred!r} if m in sys.modules))))
+"""
+
+
+def probe(module):
+    code = PROBE.format(module=module, deferred=DEFERRED)
+    out = subprocess.run([sys.executable, "-c", code], cwd=GROUP_MGMNT, capture_output=True, text=True, check=True)
+    elapsed, loaded = literal_eval(out.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check group_mgmnt CLI import time and lazy imports")
+    parser.add_argument("--module", default="main", help="Entry module inside group_mgmnt")
+    parser.add_argument("--budget", type=float, default=0.25, help="Seconds allowed for the import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Save the result as JSON")
+    args = parser.parse_args()
+
+    results = [probe(args.module) for _ in range(args.runs)]
+    best = min(elapsed for elapsed, _ in results)
+    loaded = sorted({m for _, mods in results for m in mods})
+    ok = best <= args.budget and not loaded
+    result = {"module": args.module, "best_seconds": best, "budget_seconds": args.budget,
+              "deferred_modules_loaded": loaded, "ok": ok}
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import threading
+import time
+from config import DB_FILE
+
+# Receiver progress lives in DB_FILE so a restarted receiver can pick up an
+# unfinished session: the session key and group settings, plus per file the
+# .part path and the bitmap of chunks already durable on disk. The file holds
+# the session key, so it is created owner-only and rows are dropped as soon
+# as the transfer completes.
+
+
+class CheckpointStore:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        os.close(fd)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Sessions (
+                session_id TEXT PRIMARY KEY,
+                sender_ip TEXT,
+                repair_port INTEGER,
+                cipher_mode TEXT,
+                aes_key BLOB,
+                mcast_group TEXT,
+                mcast_port INTEGER,
+                stripes INTEGER,
+                output_dir TEXT,
+                updated REAL,
+                compression TEXT DEFAULT 'none',
+                file_count INTEGER DEFAULT 0
+            )
+        """)
+        self.add_column("Sessions", "compression", "TEXT DEFAULT 'none'")
+        self.add_column("Sessions", "file_count", "INTEGER DEFAULT 0")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Files (
+                file_id TEXT PRIMARY KEY,
+                session_id TEXT,
+                name TEXT,
+                size INTEGER,
+                seq_base INTEGER,
+                fec_block INTEGER,
+                bitmap BLOB,
+                received INTEGER,
+                updated REAL,
+                digest BLOB,
+                chunk_size INTEGER
+            )
+        """)
+        self.add_column("Files", "digest", "BLOB")
+        self.add_column("Files", "chunk_size", "INTEGER")
+        self.conn.commit()
+
+    def add_column(self, table, column, declaration):
+        # Stores written by an older receiver lack the newer columns
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def save_session(self, session_id, session):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO Sessions (session_id, sender_ip, repair_port, cipher_mode, aes_key, "
+                "mcast_group, mcast_port, stripes, output_dir, updated, compression) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, session["sender_ip"], session["repair_port"], session["cipher_mode"],
+                 session["aes_key"], session["mcast_group"], session["mcast_port"], session["stripes"],
+                 session["output_dir"], time.time(), session["compression"]))
+            self.conn.commit()
+
+    def save_file_count(self, session_id, file_count):
+        # Announced by the manifests; lets a resumed session notice a file it never heard of
+        with self.lock:
+            self.conn.execute("UPDATE Sessions SET file_count = ? WHERE session_id = ?", (file_count, session_id))
+            self.conn.commit()
+
+    def save_file(self, session_id, incoming):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO Files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (incoming.file_id, session_id, incoming.name, incoming.size, incoming.seq_base,
+                 incoming.fec_block, bytes(incoming.received.bits), incoming.received.count, time.time(),
+                 incoming.digest, incoming.chunk_size))
+            self.conn.commit()
+
+    def save_progress(self, progress):
+        # progress: list of (file_id, bitmap bytes, received count)
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE Files SET bitmap = ?, received = ?, updated = ? WHERE file_id = ?",
+                [(bits, count, now, file_id) for file_id, bits, count in progress])
+            if progress:
+                self.conn.execute("UPDATE Sessions SET updated = ? WHERE session_id IN "
+                                  "(SELECT session_id FROM Files WHERE file_id = ?)", (now, progress[0][0]))
+            self.conn.commit()
+
+    def load_unfinished(self):
+        with self.lock:
+            cursor = self.conn.execute("SELECT * FROM Sessions ORDER BY updated DESC LIMIT 1")
+            row = cursor.fetchone()
+            if row is None:
+                return None, []
+            session = dict(zip([c[0] for c in cursor.description], row))
+            cursor = self.conn.execute("SELECT * FROM Files WHERE session_id = ?", (session["session_id"],))
+            columns = [c[0] for c in cursor.description]
+            files = [dict(zip(columns, r)) for r in cursor.fetchall()]
+            return session, files
+
+    def drop_session(self, session_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM Files WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM Sessions WHERE session_id = ?", (session_id,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,75 @@
+import zlib
+from config import CHUNK_SIZE
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always there
+    zstandard = None
+
+# When a session compresses, every data message carries one flags byte in
+# front of the chunk saying how that chunk was stored. Chunks that do not
+# shrink go out raw, so already-compressed files cost one byte per packet.
+FLAG_RAW = 0
+FLAG_ZLIB = 1
+FLAG_ZSTD = 2
+
+# pack() must give the same bytes for the same chunk every time: a repair that
+# misses the retransmit cache seals the chunk again under the same seq nonce.
+# So instead of remembering recent misses, each chunk is judged on its own by
+# deflating a sample at the fastest level; samples that do not shrink by
+# PROBE_GAIN mark the chunk as incompressible and it goes out raw.
+PROBE_BYTES = 512
+PROBE_GAIN = 0.9
+
+
+def available_codecs():
+    return ("zlib", "zstd") if zstandard is not None else ("zlib",)
+
+
+class ChunkCompressor:
+    def __init__(self, codec="zlib", level=None):
+        if codec not in available_codecs():
+            raise ValueError(f"Compression codec not available: {codec}")
+        self.codec = codec
+        if codec == "zstd":
+            self.flag = FLAG_ZSTD
+            self.compress = zstandard.ZstdCompressor(level=3 if level is None else level).compress
+        else:
+            self.flag = FLAG_ZLIB
+            zlib_level = 6 if level is None else level
+            self.compress = lambda data: zlib.compress(data, zlib_level)
+        self.packed = 0
+        self.raw = 0
+
+    def pack(self, chunk):
+        # Depends only on the chunk; the counters are for reporting
+        sample = chunk[:PROBE_BYTES]
+        if len(chunk) > PROBE_BYTES and len(zlib.compress(sample, 1)) > len(sample) * PROBE_GAIN:
+            self.raw += 1
+            return bytes((FLAG_RAW,)) + chunk
+        body = self.compress(chunk)
+        if len(body) >= len(chunk):
+            self.raw += 1
+            return bytes((FLAG_RAW,)) + chunk
+        self.packed += 1
+        return bytes((self.flag,)) + body
+
+
+def unpack_chunk(data, limit=CHUNK_SIZE):
+    # Returns the original chunk, or None for an unknown flag or a chunk that
+    # would inflate past one CHUNK_SIZE
+    if not data:
+        return None
+    flag, body = data[0], data[1:]
+    if flag == FLAG_RAW:
+        return body
+    try:
+        if flag == FLAG_ZLIB:
+            inflater = zlib.decompressobj()
+            chunk = inflater.decompress(body, limit)
+            return chunk if not inflater.unconsumed_tail else None
+        if flag == FLAG_ZSTD and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompress(body, max_output_size=limit)
+    except Exception:  # zlib.error or zstandard.ZstdError
+        return None
+    return None
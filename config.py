@@ -1,6 +1,58 @@
 MULTICAST_TTL = 2
 PORT = 5007
 DB_FILE = "temp_packets.db"
-CHUNK_SIZE = 8192 
+CHUNK_SIZE = 8192  # largest chunk; by default chunks are sized to fit one frame (see mtu.py)
 METADATA_MAGIC = b'META'
 
+SEND_RATE_MBPS = 200
+SEND_RATE_PPS = None
+SEND_BURST_PACKETS = 32
+RETRANSMIT_CACHE_BYTES = 64 * 1024 * 1024
+FEC_MAGIC = b'FECP'
+FEC_BLOCK_SIZE = 0  # data packets per XOR parity packet; 0 disables FEC
+PENDING_PACKET_LIMIT = 256  # packets buffered before the metadata packet arrives
+RECV_BUFFER_BYTES = 8 * 1024 * 1024
+RECEIVE_WORKERS = 4
+RECEIVE_QUEUE_LIMIT = 4096  # datagrams held between the socket and the workers
+CIPHER_MODE = "gcm"  # gcm, chacha20 or cbc (legacy)
+IO_BATCH_SIZE = 32  # datagrams per sendmmsg/recvmmsg call
+STRIPES = 1  # sender worker processes, one per multicast port (mcast_port + k)
+STRIPE_RUN = 64  # consecutive chunks a stripe sends before the next stripe takes over
+REPAIR_IDLE_TIMEOUT = 5  # seconds without repair traffic before the session ends
+REPAIR_MAX_SECONDS = 300
+REPAIR_RESUME_GRACE = 60  # seconds the sender keeps repairing for a receiver that dropped unfinished
+REPAIR_MAX_ROUNDS = 5
+REPAIR_MODE = "multicast"  # "multicast": re-send the union of NACKs once; "unicast": per receiver over TCP
+REPAIR_AGGREGATE_WINDOW = 0.2  # seconds of NACKs collected into one multicast repair round
+MULTICAST_SETTLE = 0.05  # seconds a receiver waits for in-flight multicast repairs after a round
+CHECKPOINT_INTERVAL = 2  # seconds between receiver progress checkpoints
+DELTA_MAGIC = b'DLTA'
+DELTA_SYNC = False  # send chunk-hash recipes only; receivers reuse their old copy and NACK the rest
+DELTA_RECIPE_COPIES = 2  # a lost recipe packet costs a full re-send of its chunks, so send it twice
+COMPRESSION = "none"  # "zlib", "zstd" (needs the zstandard package) or "none"
+COMPRESSION_LEVEL = None  # codec default when None
+METRICS_DIR = "./transfer_metrics/"  # one JSON summary per transfer
+METRICS_PROMETHEUS = False  # also keep syncnet_<role>.prom there for a textfile collector
+MANIFEST_EVERY = 256  # data packets between repeats of the current file's manifest
+MULTICAST_IDLE_TIMEOUT = 3  # seconds of silence after which a receiver stops waiting for EOF
+MULTICAST_FIRST_PACKET_TIMEOUT = 120  # seconds to wait for the first packet; the sender picks files after the handshake
+MTU = None  # link MTU in bytes; None asks the kernel for the multicast route's MTU
+JUMBO_FRAMES = False  # allow frames above 1500 bytes, up to 9000
+CONGESTION_CONTROL = True  # adapt the send rate to receiver feedback (unstriped, paced sends only)
+FEEDBACK_INTERVAL = 0.1  # seconds between receiver feedback reports
+CC_MIN_RATE_MBPS = 10
+CC_MAX_RATE_MBPS = 1000
+CC_INCREASE_MBPS = 10  # additive step per interval while every receiver keeps up
+CC_DECREASE = 0.7  # multiplicative cut when one does not
+CC_LOSS_THRESHOLD = 0.02
+CC_QUEUE_THRESHOLD = 0.5  # fraction of RECEIVE_QUEUE_LIMIT
+KEY_EXCHANGE_TIMEOUT = 10  # seconds for one receiver's whole handshake
+KEY_EXCHANGE_WORKERS = 32  # receivers handshaking at once
+HANDSHAKE_MODE = "x25519"  # receivers: "x25519", or "rsa" to serve senders without X25519 support
+RECEIVER_IDENTITY_FILE = "~/.syncnet_receiver_identity"  # long-lived X25519 key, created on first run
+SESSION_TICKETS = True  # repeat transfers between the same sender and receiver skip the DH
+SENDER_TICKET_FILE = "~/.syncnet_sender_tickets.json"
+RECEIVER_TICKET_FILE = "~/.syncnet_receiver_tickets.json"
+TICKET_LIFETIME = 7 * 24 * 3600  # seconds
+INBOX_DIR = "./inbox/"  # where the receiver service (receiver_daemon.py) drops finished files
+CHANNEL_CLAIM_WAIT = 2  # seconds a new sender waits for the last transfer on its group/port to close
@@ -0,0 +1,92 @@
+import struct
+import threading
+import time
+
+# Receiver feedback and AIMD rate control for the first multicast pass.
+# Receivers send a FEEDBACK frame over the repair connection every interval
+# with the loss they saw and how full their decrypt queue is; the sender
+# adds a fixed step per interval while every receiver keeps up and cuts the
+# rate multiplicatively when the worst one does not, NORM-style.
+
+FEEDBACK_MAGIC = b"FEEDBACK"
+FEEDBACK = struct.Struct(">ff")  # loss fraction, receive queue fill fraction
+
+# Loss a receiver sees at any rate (a lossy link, not congestion) becomes its
+# floor: the floor follows the lowest loss reported and creeps up by this much
+# per report, so only loss above floor + threshold counts as congestion.
+FLOOR_DRIFT = 0.005
+LOSS_SMOOTHING = 0.25  # weight of the newest report in each receiver's loss average
+
+
+class LossMeter:
+    # First-pass data seqs rise monotonically on an unstriped send, so the
+    # seqs skipped as the high-water mark advances are the packets lost
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.high = None
+        self.mark = None  # high-water mark at the previous sample
+        self.got = 0
+
+    def observe(self, seq):
+        with self.lock:
+            if self.high is None:
+                self.high = self.mark = seq - 1
+            if seq > self.mark:
+                self.got += 1
+            if seq > self.high:
+                self.high = seq
+
+    def sample(self):
+        with self.lock:
+            if self.high is None or self.high == self.mark:
+                return 0.0
+            loss = 1 - self.got / (self.high - self.mark)
+            self.mark, self.got = self.high, 0
+        return min(1.0, max(0.0, loss))
+
+
+class RateController:
+    def __init__(self, pacer, min_mbps, max_mbps, step_mbps, decrease, loss_threshold, queue_threshold,
+                 interval):
+        self.pacer = pacer
+        self.min_mbps = min_mbps
+        self.max_mbps = max_mbps
+        self.step_mbps = step_mbps
+        self.decrease = decrease
+        self.loss_threshold = loss_threshold
+        self.queue_threshold = queue_threshold
+        self.interval = interval
+        self.rate = pacer.rate_mbps()
+        self.reports = {}  # receiver -> (time, loss above its floor, queue fill)
+        self.floors = {}
+        self.smoothed = {}
+        self.last_change = 0.0
+        self.decreases = 0
+        self.increases = 0
+
+    def report(self, receiver, loss, queue):
+        now = time.monotonic()
+        previous = self.smoothed.get(receiver, loss)
+        loss = previous + LOSS_SMOOTHING * (loss - previous)
+        self.smoothed[receiver] = loss
+        floor = min(loss, self.floors.get(receiver, loss) + FLOOR_DRIFT)
+        self.floors[receiver] = floor
+        self.reports[receiver] = (now, loss - floor, queue)
+        fresh = [r for r in self.reports.values() if now - r[0] < 5 * self.interval]
+        worst_loss = max(r[1] for r in fresh)
+        worst_queue = max(r[2] for r in fresh)
+        congested = worst_loss > self.loss_threshold or worst_queue > self.queue_threshold
+        # One change per interval however many receivers report, and a cut waits
+        # two intervals so the previous one can take effect first
+        if now - self.last_change < (2 if congested else 1) * self.interval:
+            return
+        if congested:
+            rate = max(self.min_mbps, self.rate * self.decrease)
+            self.decreases += 1
+        else:
+            rate = min(self.max_mbps, self.rate + self.step_mbps)
+            self.increases += 1
+        self.last_change = now
+        if rate != self.rate:
+            self.rate = rate
+            self.pacer.set_rate_mbps(rate)
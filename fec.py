@@ -0,0 +1,98 @@
+import struct
+
+# Single-parity XOR code: one parity packet per block of N data messages lets
+# the receiver rebuild any one lost message in that block without a repair.
+# Messages are XORed as little-endian ints so shorter ones are implicitly
+# zero-padded, and their lengths are XORed alongside to restore the size.
+PARITY_HEADER = struct.Struct(">IHI")  # first_seq, count, xor of lengths
+
+
+class FecEncoder:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.reset()
+
+    def reset(self):
+        self.first_seq = None
+        self.count = 0
+        self.parity = 0
+        self.lengths = 0
+        self.width = 0
+
+    def add(self, seq, msg):
+        if self.count == 0:
+            self.first_seq = seq
+        self.parity ^= int.from_bytes(msg, 'little')
+        self.lengths ^= len(msg)
+        self.width = max(self.width, len(msg))
+        self.count += 1
+        if self.count == self.block_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        if not self.count:
+            return None
+        block_index = self.first_seq // self.block_size
+        body = PARITY_HEADER.pack(self.first_seq, self.count, self.lengths) + self.parity.to_bytes(self.width, 'little')
+        self.reset()
+        return block_index, body
+
+
+class FecDecoder:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.blocks = {}  # block index -> running XOR state of what has arrived
+        self.done = set()  # blocks already complete, so late parity is ignored
+        self.recovered = 0
+
+    def _block(self, index):
+        block = self.blocks.get(index)
+        if block is None:
+            block = self.blocks[index] = {"seen": set(), "xor": 0, "lengths": 0, "parity": None}
+        return block
+
+    def add_data(self, seq, msg):
+        index = seq // self.block_size
+        if index in self.done:
+            return []
+        block = self._block(index)
+        if seq in block["seen"]:
+            return []
+        block["seen"].add(seq)
+        block["xor"] ^= int.from_bytes(msg, 'little')
+        block["lengths"] ^= len(msg)
+        return self._try_recover(index, block)
+
+    def add_parity(self, index, body):
+        if index in self.done:
+            return []
+        first_seq, count, lengths = PARITY_HEADER.unpack_from(body)
+        block = self._block(index)
+        if block["parity"] is None:
+            block["parity"] = (first_seq, count, lengths, int.from_bytes(body[PARITY_HEADER.size:], 'little'))
+        return self._try_recover(index, block)
+
+    def _try_recover(self, index, block):
+        parity = block["parity"]
+        if parity is None:
+            if len(block["seen"]) == self.block_size:
+                self._finish(index)
+            return []
+        first_seq, count, lengths, value = parity
+        if len(block["seen"]) >= count:
+            self._finish(index)
+            return []
+        if len(block["seen"]) < count - 1:
+            return []
+
+        missing = next(s for s in range(first_seq, first_seq + count) if s not in block["seen"])
+        length = lengths ^ block["lengths"]
+        msg = (value ^ block["xor"]).to_bytes(length, 'little')
+        self._finish(index)
+        self.recovered += 1
+        return [(missing, msg)]
+
+    def _finish(self, index):
+        del self.blocks[index]
+        self.done.add(index)
@@ -0,0 +1,57 @@
+import os
+import threading
+
+
+class FileSink:
+    def __init__(self, final_path, size, resume=False):
+        self.final_path = final_path
+        self.part_path = final_path + ".part"
+        self.size = size
+        self.resumed = resume and os.path.exists(self.part_path)
+        if self.resumed:
+            # Reopen a checkpointed part file and keep the chunks already in it
+            self.fd = os.open(self.part_path, os.O_RDWR)
+            os.ftruncate(self.fd, size)
+        else:
+            self.fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            self.preallocate()
+        self.lock = threading.Lock()  # only needed where os.pwrite is unavailable
+
+    def preallocate(self):
+        if self.size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(self.fd, 0, self.size)
+            except OSError:
+                pass  # e.g. tmpfs/NFS without fallocate; ftruncate below still sizes it
+        os.ftruncate(self.fd, self.size)
+
+    def write_at(self, offset, data):
+        if hasattr(os, "pwrite"):
+            os.pwrite(self.fd, data, offset)
+            return
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            os.write(self.fd, data)
+
+    def sync(self):
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self.fd)
+        else:
+            os.fsync(self.fd)
+
+    def close(self):
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.fd = None
+
+    def finish(self):
+        self.close()
+        os.replace(self.part_path, self.final_path)
+        return self.final_path
+
+    def abort(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
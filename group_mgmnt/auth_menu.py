@@ -13,7 +13,7 @@ console = Console()
 def clear():
     os.system("cls" if os.name == "nt" else "clear")
 
-def show_auth_menu():
+def show_auth_menu(splash=True):
     clear()
 
     # Animated banner-style heading
@@ -58,17 +58,20 @@ def show_auth_menu():
 
             if choice == "1":
                 console.print("\n[bold green]🔓 Redirecting to Login...[/bold green]")
-                time.sleep(1)
+                if splash:
+                    time.sleep(1)
                 return "login"
 
             elif choice == "2":
                 console.print("\n[bold blue]📝 Redirecting to Registration...[/bold blue]")
-                time.sleep(1)
+                if splash:
+                    time.sleep(1)
                 return "register"
 
             elif choice == "3":
                 console.print("\n[bold red]👋 Exiting SyncNet.[/bold red]")
-                goodbye.goodbye_screen()
+                if splash:
+                    goodbye.goodbye_screen()
                 exit()
 
         except KeyboardInterrupt:
@@ -10,9 +10,6 @@ import os
 
 sys.path.append(os.path.abspath(".."))
 
-from secr import SecureSender
-from discovery_ui import ReceiverServiceBrowser
-
 console = Console()
 
 def connect_db():
@@ -38,10 +35,11 @@ def show_dashboard(user):
         console.print("[bold green]3.[/bold green] 🏬 View listed Regional Hubs")
         console.print("[bold blue]4.[/bold blue] 📤 Send Orders")
         console.print("[bold blue]5.[/bold blue] 📥 Receive Orders")
+        console.print("[bold blue]6.[/bold blue] 📬 Run Receiver Service (keeps accepting orders into the inbox)")
         console.print("[bold yellow]9.[/bold yellow] 🧾 View my registration details")
         console.print("[bold red]0.[/bold red] 🔒 Logout")
 
-        choice = Prompt.ask("\n[bold white]Enter your choice[/bold white]", choices=["1", "2", "3", "4", "5", "9", "0"])
+        choice = Prompt.ask("\n[bold white]Enter your choice[/bold white]", choices=["1", "2", "3", "4", "5", "6", "9", "0"])
 
         if choice == "1":
             show_listed_warehouses()
@@ -51,6 +49,7 @@ def show_dashboard(user):
             show_listed_hubs()
         elif choice == "4":
             console.print("[cyan]Launching Secure Sender...[/cyan]")
+            from secr import SecureSender  # the transfer stack loads only when a transfer starts
             sender = SecureSender()
             sender.run()
         elif choice == "5":
@@ -58,6 +57,14 @@ def show_dashboard(user):
             receiver_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Secure_Receiver.py"))
             syncnet_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
             subprocess.run(["python", receiver_path], cwd=syncnet_dir)
+        elif choice == "6":
+            console.print("[cyan]Starting Receiver Service (Ctrl+C to stop)...[/cyan]")
+            daemon_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "receiver_daemon.py"))
+            syncnet_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+            try:
+                subprocess.run(["python", daemon_path], cwd=syncnet_dir)
+            except KeyboardInterrupt:
+                pass
         elif choice == "9":
             show_user_details(user_id)
         elif choice == "0":
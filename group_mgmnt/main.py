@@ -3,15 +3,17 @@ from auth_menu import show_auth_menu
 from register import register_user
 from login import login_user
 from rich.console import Console
+import argparse
 
 console = Console()
 
-def main():
+def main(splash=True):
     # Show welcome screen at startup
-    welcome_screen()
+    if splash:
+        welcome_screen()
 
     while True:
-        action = show_auth_menu()
+        action = show_auth_menu(splash)
 
         if action == "register":
             register_user()
@@ -24,4 +26,7 @@ def main():
             console.input("\n[bold green]Press Enter to return to menu...[/bold green]")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="SyncNet terminal interface")
+    parser.add_argument("--no-splash", action="store_true", help="Skip the welcome and goodbye screens and their pauses")
+    args = parser.parse_args()
+    main(splash=not args.no_splash)
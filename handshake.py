@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from helpers import recv_exact, send_frame, recv_frame
+
+# X25519 key agreement for the TCP setup. The receiver opens with
+#   HELLO_MAGIC | identity public key | ephemeral public key | nonce
+# where the identity key is long-lived and kept on disk. The sender answers
+# with one frame that seals the session (multicast) key under a key derived
+# from both DH results, so only the holder of that identity key can open it:
+#   FULL   | sender ephemeral public key | nonce | sealed session key
+# or, when it still holds a ticket from an earlier exchange with the same
+# identity, skips the DH altogether:
+#   TICKET | ticket id | nonce | sealed session key
+# The receiver replies OK plus the id of a fresh single-use ticket (both sides
+# derived its secret), or NO_TICKET so the sender falls back to FULL. Older
+# senders wait for a PEM key, so receivers set HANDSHAKE_MODE = "rsa" to
+# serve them.
+
+HELLO_MAGIC = b"SNX1"
+HELLO_SIZE = len(HELLO_MAGIC) + 32 + 32 + 16
+FULL = b"F"
+TICKET = b"T"
+OK = b"OK"
+NO_TICKET = b"NO_TICKET"
+NONCE_SIZE = 16
+TICKET_ID_SIZE = 16
+
+
+def raw_public(key):
+    return key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+
+def load_identity(path):
+    path = os.path.expanduser(path)
+    if not os.path.exists(path):
+        # Written aside and linked into place, so a receiver starting at the
+        # same moment reads a whole key rather than racing to create its own
+        raw = X25519PrivateKey.generate().private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                                        serialization.NoEncryption())
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path, "rb") as f:
+        return X25519PrivateKey.from_private_bytes(f.read())
+
+
+def derive(secret, salt, info):
+    # Key that seals this exchange's session key, then the next ticket's secret
+    okm = HKDF(algorithm=hashes.SHA256(), length=64, salt=salt, info=info).derive(secret)
+    return okm[:32], okm[32:]
+
+
+def seal(kek, session_key, hello):
+    # Every kek seals exactly one key, so a fixed nonce is safe
+    return AESGCM(kek).encrypt(bytes(12), session_key, hello)
+
+
+def unseal(kek, sealed, hello):
+    return AESGCM(kek).decrypt(bytes(12), sealed, hello)
+
+
+class TicketStore:
+    # Resumption secrets in a JSON file readable by the owner only. Senders key
+    # tickets by the receiver's identity, receivers by ticket id; each ticket
+    # is used once and replaced by the one issued in the same exchange.
+    def __init__(self, path, lifetime):
+        self.path = os.path.expanduser(path)
+        self.lifetime = lifetime
+        self.lock = threading.Lock()
+        self.tickets = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.tickets = json.load(f)
+            except (OSError, ValueError):
+                self.tickets = {}
+        now = time.time()
+        self.tickets = {k: v for k, v in self.tickets.items() if v[2] > now}
+
+    def save(self):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.tickets, f)
+        os.replace(tmp, self.path)
+
+    def put(self, key, ticket_id, secret):
+        with self.lock:
+            self.tickets[key] = [ticket_id.hex(), secret.hex(), time.time() + self.lifetime]
+            self.save()
+
+    def pop(self, key):
+        # Saved with the replacement ticket: a replayed ticket frame cannot
+        # open anyway, as the receiver's fresh nonce changes the derived key
+        with self.lock:
+            entry = self.tickets.pop(key, None)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return bytes.fromhex(entry[0]), bytes.fromhex(entry[1])
+
+
+def receiver_exchange(conn, identity, tickets=None):
+    # Returns the session key, or raises ValueError when the sender's frame does not open
+    ephemeral = X25519PrivateKey.generate()
+    identity_pub = raw_public(identity)
+    nonce = os.urandom(NONCE_SIZE)
+    hello = HELLO_MAGIC + identity_pub + raw_public(ephemeral) + nonce
+    conn.sendall(hello)
+    while True:
+        frame = recv_frame(conn)
+        if frame is None:
+            raise ConnectionError("sender closed during the key exchange")
+        if frame[:1] == TICKET:
+            ticket_id = frame[1:1 + TICKET_ID_SIZE]
+            sender_nonce = frame[1 + TICKET_ID_SIZE:1 + TICKET_ID_SIZE + NONCE_SIZE]
+            entry = tickets.pop(ticket_id.hex()) if tickets is not None else None
+            if entry is None:
+                send_frame(conn, NO_TICKET)
+                continue
+            secret = entry[1]
+            info = b"syncnet ticket" + identity_pub
+            sealed = frame[1 + TICKET_ID_SIZE + NONCE_SIZE:]
+        elif frame[:1] == FULL:
+            sender_pub = frame[1:33]
+            sender_nonce = frame[33:33 + NONCE_SIZE]
+            peer = X25519PublicKey.from_public_bytes(sender_pub)
+            secret = ephemeral.exchange(peer) + identity.exchange(peer)
+            info = b"syncnet x25519" + identity_pub + sender_pub
+            sealed = frame[33 + NONCE_SIZE:]
+        else:
+            raise ValueError("unknown key exchange frame")
+        kek, next_secret = derive(secret, nonce + sender_nonce, info)
+        try:
+            session_key = unseal(kek, sealed, hello)
+        except InvalidTag:
+            raise ValueError("session key failed to authenticate")
+        ticket_id = os.urandom(TICKET_ID_SIZE)
+        if tickets is not None:
+            tickets.put(ticket_id.hex(), ticket_id, next_secret)
+            send_frame(conn, OK + ticket_id)
+        else:
+            send_frame(conn, OK)
+        return session_key
+
+
+def sender_exchange(sock, session_key, tickets=None):
+    # Call once the receiver's HELLO_MAGIC has been read from sock; returns
+    # "ticket" when a ticket stood in for the DH, else "x25519"
+    rest = recv_exact(sock, HELLO_SIZE - len(HELLO_MAGIC))
+    if rest is None:
+        raise ConnectionError("closed during the key exchange hello")
+    hello = HELLO_MAGIC + rest
+    identity_pub, receiver_pub, nonce = rest[:32], rest[32:64], rest[64:]
+    info_key = identity_pub.hex()
+    entry = tickets.pop(info_key) if tickets is not None else None
+    while True:
+        sender_nonce = os.urandom(NONCE_SIZE)
+        if entry is not None:
+            ticket_id, secret = entry
+            kek, next_secret = derive(secret, nonce + sender_nonce, b"syncnet ticket" + identity_pub)
+            send_frame(sock, TICKET + ticket_id + sender_nonce + seal(kek, session_key, hello))
+        else:
+            ephemeral = X25519PrivateKey.generate()
+            sender_pub = raw_public(ephemeral)
+            secret = (ephemeral.exchange(X25519PublicKey.from_public_bytes(receiver_pub)) +
+                      ephemeral.exchange(X25519PublicKey.from_public_bytes(identity_pub)))
+            kek, next_secret = derive(secret, nonce + sender_nonce,
+                                      b"syncnet x25519" + identity_pub + sender_pub)
+            send_frame(sock, FULL + sender_pub + sender_nonce + seal(kek, session_key, hello))
+        reply = recv_frame(sock)
+        if reply == NO_TICKET and entry is not None:
+            entry = None  # the receiver lost or expired it; do the full exchange
+            continue
+        if reply is None or not reply.startswith(OK):
+            raise ConnectionError("receiver rejected the key exchange")
+        if tickets is not None and len(reply) == len(OK) + TICKET_ID_SIZE:
+            tickets.put(info_key, reply[len(OK):], next_secret)
+        return "ticket" if entry is not None else "x25519"
@@ -1,4 +1,5 @@
 import socket
+
 def get_current_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -8,3 +9,22 @@ def get_current_ip():
     finally:
         s.close()
     return ip
+
+def recv_exact(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+def send_frame(sock, payload):
+    # Length-prefixed frames keep TCP messages from running together
+    sock.sendall(len(payload).to_bytes(4, 'big') + payload)
+
+def recv_frame(sock):
+    header = recv_exact(sock, 4)
+    if header is None:
+        return None
+    return recv_exact(sock, int.from_bytes(header, 'big'))
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Per-transfer counters, gauges and histograms for sender and receiver. They
+# are bumped from worker threads, so every update takes the metric's lock.
+# export() writes one JSON summary per transfer and, when asked, a
+# Prometheus text file that a node_exporter textfile collector can pick up.
+
+# Seconds; per-packet seal/open sits in the low microseconds
+LATENCY_BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 5e-3, 1e-2)
+
+
+class Counter:
+    def __init__(self, help_text):
+        self.help = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    def __init__(self, help_text):
+        self.help = help_text
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, help_text, buckets=LATENCY_BUCKETS):
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50_le": self.quantile(0.5),
+            "p99_le": self.quantile(0.99),
+            "buckets": {str(b): n for b, n in zip(self.buckets + ("+Inf",), self.counts)},
+        }
+
+
+class Metrics:
+    def __init__(self, role):
+        self.role = role
+        self.started = time.time()
+        self.metrics = {}
+
+    def _get(self, kind, name, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics.setdefault(name, kind(*args))
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def summary(self):
+        result = {"role": self.role, "started": self.started, "finished": time.time()}
+        for name, metric in sorted(self.metrics.items()):
+            result[name] = metric.summary() if isinstance(metric, Histogram) else metric.value
+        return result
+
+    def prometheus_text(self):
+        lines = []
+        label = f'role="{self.role}"'
+        for name, metric in sorted(self.metrics.items()):
+            full = f"syncnet_{name}"
+            if isinstance(metric, Counter):
+                lines += [f"# HELP {full}_total {metric.help}", f"# TYPE {full}_total counter",
+                          f"{full}_total{{{label}}} {metric.value}"]
+            elif isinstance(metric, Gauge):
+                lines += [f"# HELP {full} {metric.help}", f"# TYPE {full} gauge",
+                          f"{full}{{{label}}} {metric.value}"]
+            else:
+                lines += [f"# HELP {full} {metric.help}", f"# TYPE {full} histogram"]
+                cumulative = 0
+                for bound, n in zip(metric.buckets + ("+Inf",), metric.counts):
+                    cumulative += n
+                    lines.append(f'{full}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines += [f"{full}_sum{{{label}}} {metric.sum}", f"{full}_count{{{label}}} {metric.count}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory, prometheus=False, tag=None):
+        # JSON per transfer, named by start time and a tag (session id, else pid) so
+        # transfers started in the same second do not overwrite each other; the
+        # Prometheus file is replaced so collectors see the latest transfer
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        json_path = os.path.join(directory, f"{self.role}-{stamp}-{tag or os.getpid()}.json")
+        with open(json_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        if prometheus:
+            prom_path = os.path.join(directory, f"syncnet_{self.role}.prom")
+            with open(prom_path + ".tmp", "w") as f:
+                f.write(self.prometheus_text())
+            os.replace(prom_path + ".tmp", prom_path)
+        return json_path
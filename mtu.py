@@ -0,0 +1,43 @@
+import socket
+from config import CHUNK_SIZE
+
+# Chunks are sized so the largest datagram of a session (a parity packet)
+# fits one link-layer frame. A chunk split into IP fragments is lost when any
+# fragment is, so an 8 KiB chunk on a 1500-byte link sees roughly six times
+# the loss rate of a single frame.
+
+IP_MTU = getattr(socket, "IP_MTU", 14)  # Linux only
+ETHERNET_MTU = 1500
+JUMBO_MTU = 9000
+MIN_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 16384  # receivers read datagrams into 20 KiB buffers
+
+IP_UDP_HEADERS = 20 + 8
+PARITY_FRAMING = 4 + 4 + 10  # FEC_MAGIC, block index, PARITY_HEADER
+MESSAGE_HEADER = 2 + 36 + 4  # file id length, uuid4 string, seq
+CIPHER_OVERHEAD = {"gcm": 16, "chacha20": 16, "cbc": 16 + 16 + 32}  # tag; or IV, worst-case padding, hash
+
+
+def discover_mtu(group, port):
+    # Linux reports the MTU of the route a connected UDP socket would use
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((group, port))
+        return sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError:
+        return None
+    finally:
+        sock.close()
+
+
+def datagram_overhead(cipher_mode, compressed):
+    return (IP_UDP_HEADERS + PARITY_FRAMING + MESSAGE_HEADER + (1 if compressed else 0) +
+            CIPHER_OVERHEAD[cipher_mode])
+
+
+def pick_chunk_size(mtu, cipher_mode, compressed=False, jumbo=False):
+    # Interfaces such as loopback report huge MTUs the receivers' links will not
+    # have, so anything above Ethernet needs jumbo frames switched on
+    mtu = mtu or ETHERNET_MTU
+    mtu = min(mtu, JUMBO_MTU if jumbo else ETHERNET_MTU)
+    return max(MIN_CHUNK_SIZE, min(CHUNK_SIZE, mtu - datagram_overhead(cipher_mode, compressed)))
@@ -0,0 +1,144 @@
+import re
+import struct
+import zlib
+
+# Wire format of a missing-packet request (NACK). A frame holds one section
+# per incomplete file, each relative to that file's first seq (base):
+#   b'R' + >I base + >I n + n * (>I start, >I length)         range list
+#   b'B' + >I base + >I nbits + >I zlen + zlib(missing bits)   bitmap
+# encode_nack() picks whichever is smaller for the current loss pattern.
+NACK_RANGES = b'R'
+NACK_BITMAP = b'B'
+RANGE = struct.Struct(">II")
+INVERT = bytes(255 - b for b in range(256))
+NOT_FULL = re.compile(rb'[^\xff]+')
+NOT_EMPTY = re.compile(rb'[^\x00]+')
+NACK_MAX_SECTIONS = 1024  # per frame; receivers with more incomplete files send several frames
+
+
+class ChunkBitmap:
+    def __init__(self, total):
+        self.total = total
+        self.bits = bytearray((total + 7) // 8)
+        self.count = 0
+
+    def load(self, bits):
+        self.bits[:] = bits[:len(self.bits)]
+        self.count = bin(int.from_bytes(self.bits, 'big')).count('1')
+
+    def __contains__(self, seq):
+        return 0 <= seq < self.total and bool(self.bits[seq >> 3] & (1 << (seq & 7)))
+
+    def add(self, seq):
+        if not 0 <= seq < self.total:
+            return False
+        mask = 1 << (seq & 7)
+        if self.bits[seq >> 3] & mask:
+            return False
+        self.bits[seq >> 3] |= mask
+        self.count += 1
+        return True
+
+    def complete(self):
+        return self.count == self.total
+
+    def missing_ranges(self):
+        # Fully received bytes are skipped by the regex scan, so the Python loop
+        # only runs over the bytes around actual gaps.
+        return _ranges(self.bits, NOT_FULL, self.total, want=0)
+
+    def missing_bitmap(self):
+        inverted = bytearray(self.bits.translate(INVERT))
+        if self.total & 7:
+            inverted[-1] &= (1 << (self.total & 7)) - 1
+        return inverted
+
+
+def _ranges(bits, pattern, total, want):
+    ranges = []
+    start = None
+    end = None
+    for run in pattern.finditer(bits):
+        for byte_index in range(run.start(), run.end()):
+            byte = bits[byte_index]
+            for bit in range(8):
+                seq = (byte_index << 3) + bit
+                if seq >= total:
+                    break
+                if bool(byte & (1 << bit)) == bool(want):
+                    if start is not None and seq == end:
+                        end += 1
+                    else:
+                        if start is not None:
+                            ranges.append((start, end - start))
+                        start, end = seq, seq + 1
+    if start is not None:
+        ranges.append((start, end - start))
+    return ranges
+
+
+def encode_nack(bitmap, base=0):
+    ranges = bitmap.missing_ranges()
+    as_ranges = (NACK_RANGES + struct.pack(">II", base, len(ranges)) +
+                 b"".join(RANGE.pack(*r) for r in ranges))
+    if len(ranges) < 16:
+        return as_ranges
+    packed = zlib.compress(bytes(bitmap.missing_bitmap()))
+    as_bitmap = NACK_BITMAP + struct.pack(">III", base, bitmap.total, len(packed)) + packed
+    return as_bitmap if len(as_bitmap) < len(as_ranges) else as_ranges
+
+
+def decode_nack(payload, limit):
+    # Returns absolute (start, length) ranges across every section in the frame,
+    # sorted, merged and cut to the session's seqs [0, limit): a NACK comes from
+    # any TCP client, so neither its lengths, its bitmap sizes nor repeated
+    # sections may decide how much work we do. Bitmaps share one budget of
+    # limit bits, as the files of a real session never overlap.
+    ranges = []
+    offset = 0
+    sections = 0
+    budget = limit
+    while offset < len(payload):
+        sections += 1
+        if sections > NACK_MAX_SECTIONS:
+            raise ValueError(f"more than {NACK_MAX_SECTIONS} NACK sections in one frame")
+        kind = payload[offset:offset + 1]
+        if kind == NACK_RANGES:
+            base, count = struct.unpack_from(">II", payload, offset + 1)
+            offset += 9
+            if offset + count * RANGE.size > len(payload):
+                raise ValueError("truncated NACK range list")
+            for _ in range(count):
+                start, length = RANGE.unpack_from(payload, offset)
+                ranges.append((base + start, length))
+                offset += RANGE.size
+        elif kind == NACK_BITMAP:
+            base, total, size = struct.unpack_from(">III", payload, offset + 1)
+            offset += 13
+            total = max(0, min(total, limit - base, budget))
+            budget -= total
+            bits = zlib.decompressobj().decompress(payload[offset:offset + size], (total + 7) // 8)
+            offset += size
+            ranges.extend((base + start, length) for start, length in _ranges(bits, NOT_EMPTY, total, want=1))
+        else:
+            raise ValueError(f"unknown NACK format {kind!r}")
+    return clamp_ranges(ranges, limit)
+
+
+def clamp_ranges(ranges, limit):
+    # Overlapping or repeated ranges are merged, so the result expands to at most limit seqs
+    merged = []
+    for start, length in sorted(ranges):
+        end = min(start + length, limit)
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end - start) for start, end in merged]
+
+
+def iter_ranges(ranges):
+    for start, length in ranges:
+        yield from range(start, start + length)
@@ -0,0 +1,74 @@
+import time
+
+# Below this many seconds we busy-wait instead of sleeping, since time.sleep
+# overshoots by tens of microseconds and would cap the achievable rate.
+SPIN_THRESHOLD = 0.0002
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last = time.perf_counter()
+
+    def set_rate(self, rate):
+        self._refill(time.perf_counter())
+        self.rate = float(rate)
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def consume(self, amount):
+        # A single request larger than the bucket is let through once the bucket
+        # is full and leaves the bucket in debt, so it is still paid for.
+        needed = min(amount, self.burst)
+        while True:
+            now = time.perf_counter()
+            self._refill(now)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return
+            wait = (needed - self.tokens) / self.rate
+            if wait > SPIN_THRESHOLD:
+                time.sleep(wait - SPIN_THRESHOLD)
+
+
+class SendPacer:
+    def __init__(self, rate_mbps=None, rate_pps=None, burst_packets=32, packet_size=8192):
+        self.per_packet = bool(rate_pps)
+        self.packet_size = packet_size
+        self.pending_rate = None
+        if self.per_packet:
+            self.bucket = TokenBucket(rate_pps, burst_packets)
+        elif rate_mbps:
+            self.bucket = TokenBucket(rate_mbps * 125000, burst_packets * packet_size)
+        else:
+            self.bucket = None
+
+    def describe(self):
+        if self.bucket is None:
+            return "unpaced"
+        if self.per_packet:
+            return f"{self.bucket.rate:.0f} packets/s"
+        return f"{self.bucket.rate / 125000:.1f} Mbps"
+
+    def rate_mbps(self):
+        if self.bucket is None:
+            return None
+        if self.per_packet:
+            return self.bucket.rate * self.packet_size / 125000
+        return self.bucket.rate / 125000
+
+    def set_rate_mbps(self, rate_mbps):
+        # Called from the feedback thread; the sending thread applies it on its next wait()
+        self.pending_rate = rate_mbps * 125000 / (self.packet_size if self.per_packet else 1)
+
+    def wait(self, nbytes):
+        if self.bucket is None:
+            return
+        if self.pending_rate is not None:
+            rate, self.pending_rate = self.pending_rate, None
+            self.bucket.set_rate(rate)
+        self.bucket.consume(1 if self.per_packet else nbytes)
@@ -0,0 +1,164 @@
+import os
+import socket
+import threading
+import argparse
+from zeroconf import Zeroconf, InterfaceChoice
+from advertise import get_config_path, load_config, prompt_user_for_config, main as advertise_service
+from checkpoint import CheckpointStore
+from config import INBOX_DIR, HANDSHAKE_MODE, KEY_EXCHANGE_TIMEOUT, PORT, CHANNEL_CLAIM_WAIT
+from Secure_Receiver import SecureReceiver, open_multicast_socket
+
+# A long-running receiver: one zeroconf registration, one listening TCP port,
+# keys and ticket store loaded once, and the default multicast group joined
+# up front. Every sender that connects gets its own handshake thread and its
+# own SecureReceiver; a sender whose group and port are already in use by
+# another transfer is told BUSY at the end of its handshake rather than queued,
+# and finished files land in the inbox (as .part files until they are complete).
+
+
+class MulticastSocketPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sockets = {}  # (group, port) -> idle joined sockets
+
+    def prejoin(self, group, port):
+        self.give(group, open_multicast_socket(group, port))
+
+    def take(self, group, port):
+        with self.lock:
+            idle = self.sockets.get((group, port))
+            sock = idle.pop() if idle else None
+        if sock is None:
+            return open_multicast_socket(group, port)
+        # An idle socket stays joined, so it holds whatever other sessions sent to the
+        # group meanwhile, unauthenticated EOFs included; drop it all just before handing out
+        sock.setblocking(False)
+        try:
+            while True:
+                sock.recv(65535)
+        except OSError:
+            pass
+        sock.settimeout(0.5)
+        return sock
+
+    def give(self, group, sock):
+        with self.lock:
+            self.sockets.setdefault((group, sock.getsockname()[1]), []).append(sock)
+
+    def close(self):
+        with self.lock:
+            for idle in self.sockets.values():
+                for sock in idle:
+                    sock.close()
+            self.sockets = {}
+
+
+class ReceiverDaemon:
+    def __init__(self, tcp_port=9999, inbox=INBOX_DIR, handshake_mode=HANDSHAKE_MODE, mcast_group='224.1.1.1',
+                 mcast_port=PORT):
+        self.tcp_port = tcp_port
+        self.inbox = inbox
+        self.handshake_mode = handshake_mode
+        os.makedirs(inbox, exist_ok=True)
+        self.checkpoint = CheckpointStore()
+        self.pool = MulticastSocketPool()
+        self.pool.prejoin(mcast_group, mcast_port)
+        self.keys = SecureReceiver(handshake_mode=handshake_mode, checkpoint=self.checkpoint)
+        self.keys.load_keys()
+        self.channel_locks = {}  # (group, port) -> lock held while a transfer uses it
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.listener = None
+        self.transfers = 0
+        self.active = 0
+
+    def new_receiver(self):
+        receiver = SecureReceiver(tcp_port=self.tcp_port, output_dir=self.inbox, handshake_mode=self.handshake_mode,
+                                  checkpoint=self.checkpoint)
+        receiver.private_key, receiver.public_key = self.keys.private_key, self.keys.public_key
+        receiver.identity, receiver.tickets = self.keys.identity, self.keys.tickets
+        receiver.socket_pool = self.pool
+        receiver.claim_channel = self.claim_channel
+        return receiver
+
+    def channel_lock(self, group, port):
+        with self.lock:
+            return self.channel_locks.setdefault((group, port), threading.Lock())
+
+    def claim_channel(self, group, port):
+        # Only waits out a transfer that is closing its sockets: a sender told BUSY can
+        # retry, one queued behind a live transfer would multicast into it
+        lock = self.channel_lock(group, port)
+        if lock.acquire(timeout=CHANNEL_CLAIM_WAIT):
+            return lock.release
+        return None
+
+    def serve(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('', self.tcp_port))
+        self.listener.listen(16)
+        self.listener.settimeout(0.5)
+        print(f"📬 Receiver service on TCP {self.tcp_port}; files go to {os.path.abspath(self.inbox)}")
+        while not self.stopping.is_set():
+            try:
+                conn, addr = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self.handle_sender, args=(conn, addr), daemon=True).start()
+        self.listener.close()
+
+    def handle_sender(self, conn, addr):
+        receiver = self.new_receiver()
+        with self.lock:
+            self.active += 1
+        try:
+            conn.settimeout(KEY_EXCHANGE_TIMEOUT)
+            try:
+                receiver.handshake_connection(conn, addr)
+            finally:
+                conn.close()
+            receiver.start_session()
+            receiver.listen_multicast()
+            receiver.finish_transfer()
+            with self.lock:
+                self.transfers += 1
+            print(f"📥 Transfer from {addr[0]} done ({len(receiver.files)} file(s)); waiting for the next sender")
+        except Exception as e:
+            print(f"❌ Transfer from {addr[0]} failed: {e}")
+        finally:
+            receiver.leave_channel()
+            with self.lock:
+                self.active -= 1
+
+    def stop(self):
+        self.stopping.set()
+        if self.listener is not None:
+            self.listener.close()
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-running multicast receiver service")
+    parser.add_argument("--config", type=str, help="Path to custom config file")
+    parser.add_argument("--inbox", default=INBOX_DIR, help="Directory finished files are written to")
+
+    args = parser.parse_args()
+    zeroconf = Zeroconf(interfaces=InterfaceChoice.All)
+    config_path = get_config_path(args.config)
+    config = load_config(config_path)
+    if config is None:
+        config = prompt_user_for_config(config_path)
+
+    advertise_service(zeroconf, config)
+    daemon = ReceiverDaemon(tcp_port=config["port"], inbox=args.inbox)
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping receiver service")
+    finally:
+        daemon.stop()
+        zeroconf.unregister_all_services()
+        zeroconf.close()
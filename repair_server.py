@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import Counter
+from rich.console import Console
+from nack import decode_nack, iter_ranges
+from congestion import FEEDBACK_MAGIC
+
+console = Console()
+
+# Packets fetched from the retransmit cache per executor call, so one large
+# NACK neither blocks the event loop nor materialises every packet at once.
+# NACKs are merged and cut to seq_limit, the session's seq space, before any
+# expansion, so one frame can never ask for more than the whole session.
+REPAIR_SLICE = 256
+
+
+class RepairServer:
+    def __init__(self, host, port, receivers, get_packet, idle_timeout=5, max_duration=300,
+                 multicast_repair=None, aggregate_window=0.2, feedback=None, resume_grace=60, get_manifests=None):
+        self.host = host
+        self.port = port
+        self.outstanding = Counter(receivers)  # ip -> receivers there that have not finished
+        self.get_packet = get_packet
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.loop = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+        self.deadline_started = None
+        self.last_activity = time.monotonic()
+        self.active_rounds = 0
+        self.rounds = 0
+        self.packets_resent = 0
+        # Aggregated mode: multicast_repair(seqs) re-sends to the whole group, and
+        # NACKs that arrive within one window are merged into a single round.
+        self.multicast_repair = multicast_repair
+        self.aggregate_window = aggregate_window
+        self.pending_seqs = set()
+        self.requested = 0
+        self.waiters = []
+        self.flush_task = None
+        self.feedback = feedback  # feedback(ip, payload) for FEEDBACK frames sent during the first pass
+        # A receiver whose connection ended without COMPLETE/GIVEUP may be restarting
+        # with --resume, so it gets resume_grace seconds past the idle timeout
+        self.resume_grace = resume_grace
+        self.dropped_at = {}  # ip -> when its last connection ended unfinished
+        self.seq_limit = 0  # one past the session's last seq; set once the files are planned
+        self.get_manifests = get_manifests  # every file's sealed manifest, for receivers that lost some
+
+    def start(self):
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def wait(self):
+        # The deadline only starts once the multicast itself is done
+        self.deadline_started = time.monotonic()
+        self.last_activity = self.deadline_started
+        self.finished.wait()
+        self.thread.join()
+
+    def _touch(self):
+        self.last_activity = time.monotonic()
+
+    def _done(self):
+        if not +self.outstanding:
+            return True
+        if self.deadline_started is None or self.active_rounds:
+            return False
+        now = time.monotonic()
+        if now - self.deadline_started > self.max_duration:
+            return True
+        # Adaptive: keep going while receivers are still repairing, stop soon
+        # after they go quiet, and never run past the hard cap.
+        if any(self.outstanding[ip] > 0 and now - at < self.resume_grace for ip, at in self.dropped_at.items()):
+            return False
+        return now - self.last_activity > self.idle_timeout
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        console.print(f"🔧 [yellow]Repair server listening on {self.host}:{self.port}[/yellow]")
+        self.ready.set()
+        try:
+            while not self._done():
+                await asyncio.sleep(0.1)
+        finally:
+            server.close()
+            await server.wait_closed()
+            left = sum((+self.outstanding).values())
+            if left:
+                console.print(f"[yellow]⚠️ Repair deadline reached with {left} receiver(s) unfinished[/yellow]")
+            console.print(f"[green]✅ Repair session ended after {self.rounds} rounds, "
+                          f"{self.packets_resent} packets resent[/green]")
+            self.finished.set()
+
+    async def _read_frame(self, reader):
+        header = await reader.readexactly(4)
+        return await reader.readexactly(int.from_bytes(header, 'big'))
+
+    def _write_frame(self, writer, payload):
+        writer.write(len(payload).to_bytes(4, 'big') + payload)
+
+    async def _handle(self, reader, writer):
+        addr = writer.get_extra_info("peername")[0]
+        console.print(f"🔧 Repair connection from {addr}")
+        finished = repairing = False
+        try:
+            while True:
+                try:
+                    data = await self._read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                # Feedback is first-pass rate control, not repair: it neither
+                # keeps the repair deadline alive nor counts as a dropped receiver
+                if data.startswith(FEEDBACK_MAGIC):
+                    if self.feedback is not None:
+                        self.feedback(addr, data[len(FEEDBACK_MAGIC):])
+                    continue
+                if not repairing:
+                    repairing = True
+                    self.dropped_at.pop(addr, None)
+                self._touch()
+
+                if data in (b"COMPLETE", b"GIVEUP"):
+                    if data == b"COMPLETE":
+                        console.print(f"✅ Receiver at {addr} completed transmission.")
+                    else:
+                        console.print(f"[yellow]⚠️ Receiver at {addr} gave up with chunks missing[/yellow]")
+                    if self.outstanding[addr] > 0:
+                        self.outstanding[addr] -= 1
+                    finished = True
+                    break
+
+                if data == b"MANIFESTS":
+                    manifests = await self.loop.run_in_executor(None, self.get_manifests) if self.get_manifests else []
+                    for packet in manifests:
+                        self._write_frame(writer, packet)
+                    self._write_frame(writer, b"")
+                    await writer.drain()
+                    continue
+
+                self.active_rounds += 1
+                try:
+                    await self._serve_round(addr, data, writer)
+                finally:
+                    self.active_rounds -= 1
+                    self._touch()
+        except (ConnectionError, ValueError) as e:
+            console.print(f"[red]❌ Error handling repair request from {addr}: {e}[/red]")
+        finally:
+            if repairing and not finished and self.outstanding[addr] > 0:
+                self.dropped_at[addr] = time.monotonic()
+            writer.close()
+
+    async def _serve_round(self, addr, data, writer):
+        ranges = decode_nack(data, self.seq_limit)
+        if self.multicast_repair is not None:
+            await self._aggregate(ranges)
+            self._write_frame(writer, b"")  # repairs went out by multicast
+            await writer.drain()
+            return
+
+        seqs = iter_ranges(ranges)
+        self.rounds += 1
+        console.print(f"🔁 [cyan]Resending {sum(length for _, length in ranges)} packets in {len(ranges)} ranges "
+                      f"to {addr}[/cyan]")
+        while True:
+            part = list(itertools.islice(seqs, REPAIR_SLICE))
+            if not part:
+                break
+            packets = await self.loop.run_in_executor(None, lambda: [self.get_packet(s) for s in part])
+            for packet in packets:
+                if packet is not None:
+                    self._write_frame(writer, packet)
+                    self.packets_resent += 1
+            await writer.drain()
+            self._touch()
+        self._write_frame(writer, b"")  # end of this round
+        await writer.drain()
+
+    async def _aggregate(self, ranges):
+        waiter = self.loop.create_future()
+        before = len(self.pending_seqs)
+        # Built off the event loop: even a merged NACK may span the whole session
+        self.pending_seqs |= await self.loop.run_in_executor(None, lambda: set(iter_ranges(ranges)))
+        self.requested += sum(length for _, length in ranges)
+        self.waiters.append(waiter)
+        if self.flush_task is None:
+            self.flush_task = self.loop.create_task(self._flush_later())
+        console.print(f"📥 NACK for {len(self.pending_seqs) - before} new packets queued for the next repair round")
+        await waiter
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.aggregate_window)
+        seqs, waiters, requested = sorted(self.pending_seqs), self.waiters, self.requested
+        self.pending_seqs, self.waiters, self.requested = set(), [], 0
+        self.flush_task = None
+        self.rounds += 1
+        console.print(f"🔁 [cyan]Multicasting {len(seqs)} unique packets for {requested} requested "
+                      f"by {len(waiters)} receiver(s)[/cyan]")
+        try:
+            sent = await self.loop.run_in_executor(None, self.multicast_repair, seqs)
+            self.packets_resent += sent
+        except Exception as e:
+            for waiter in waiters:
+                waiter.set_exception(ConnectionError(f"multicast repair failed: {e}"))
+            return
+        finally:
+            self._touch()
+        for waiter in waiters:
+            waiter.set_result(None)
@@ -0,0 +1,38 @@
+import threading
+from collections import OrderedDict
+
+
+class RetransmitCache:
+    def __init__(self, loader, max_bytes):
+        self.loader = loader  # seq -> encrypted packet, used on cache misses
+        self.max_bytes = max_bytes
+        self.packets = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def put(self, seq, packet):
+        with self.lock:
+            old = self.packets.pop(seq, None)
+            if old is not None:
+                self.size -= len(old)
+            self.packets[seq] = packet
+            self.size += len(packet)
+            while self.size > self.max_bytes and self.packets:
+                _, evicted = self.packets.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get(self, seq):
+        with self.lock:
+            packet = self.packets.get(seq)
+            if packet is not None:
+                self.packets.move_to_end(seq)
+                self.hits += 1
+                return packet
+            self.misses += 1
+        # Rebuild outside the lock; re-reading and re-encrypting is the slow part
+        packet = self.loader(seq)
+        if packet is not None:
+            self.put(seq, packet)
+        return packet
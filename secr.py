@@ -2,81 +2,273 @@ import socket
 import os
 import struct
 import time
-import uuid
 import threading
-import selectors
-from hashlib import blake2b
-from cryptography.hazmat.primitives import serialization, hashes, padding as sym_padding
-from cryptography.hazmat.primitives.asymmetric import padding as asym_padding
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding as asym_padding, rsa
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from config import CHUNK_SIZE, METADATA_MAGIC
+from config import METADATA_MAGIC, SEND_RATE_MBPS, SEND_RATE_PPS, SEND_BURST_PACKETS
+from config import RETRANSMIT_CACHE_BYTES, FEC_MAGIC, FEC_BLOCK_SIZE, CIPHER_MODE, IO_BATCH_SIZE
+from config import STRIPES, STRIPE_RUN, REPAIR_IDLE_TIMEOUT, REPAIR_MAX_SECONDS, REPAIR_MODE, REPAIR_AGGREGATE_WINDOW
+from config import REPAIR_RESUME_GRACE
+from config import DELTA_MAGIC, DELTA_SYNC, DELTA_RECIPE_COPIES, COMPRESSION, COMPRESSION_LEVEL
+from config import METRICS_DIR, METRICS_PROMETHEUS, MANIFEST_EVERY, MTU, JUMBO_FRAMES
+from config import CONGESTION_CONTROL, FEEDBACK_INTERVAL, CC_MIN_RATE_MBPS, CC_MAX_RATE_MBPS, CC_INCREASE_MBPS
+from config import CC_DECREASE, CC_LOSS_THRESHOLD, CC_QUEUE_THRESHOLD, KEY_EXCHANGE_TIMEOUT, KEY_EXCHANGE_WORKERS
+from config import SESSION_TICKETS, SENDER_TICKET_FILE, TICKET_LIFETIME
+from compression import ChunkCompressor
+from metrics import Metrics
+from mtu import discover_mtu, pick_chunk_size
+from congestion import FEEDBACK, RateController
+from fec import FecEncoder
+from packet_crypto import PacketCipher, PACKET_DATA, PACKET_PARITY, PACKET_RECIPE, PACKET_MANIFEST
+from pacing import SendPacer
+from retransmit import RetransmitCache
+from batch_io import DatagramSender
+from transfer_files import OutgoingFile, collect_files, find_owner
 from ui_helpers import get_file_path
 from discovery_ui import ReceiverServiceBrowser, select_receiver
 from rich.console import Console
 from rich.panel import Panel
 from rich.align import Align
-from helpers import get_current_ip
+from helpers import get_current_ip, recv_exact
+from handshake import HELLO_MAGIC, TicketStore, sender_exchange
+from repair_server import RepairServer
 
 console = Console()
 
 class SecureSender:
-    def __init__(self):
-        self.aes_key = os.urandom(32)
-        self.iv_length = 16
+    def __init__(self, rate_mbps=SEND_RATE_MBPS, rate_pps=SEND_RATE_PPS, burst_packets=SEND_BURST_PACKETS,
+                 fec_block=FEC_BLOCK_SIZE, cipher_mode=CIPHER_MODE, stripes=STRIPES, aes_key=None,
+                 repair_mode=REPAIR_MODE, delta=DELTA_SYNC, compression=COMPRESSION,
+                 compression_level=COMPRESSION_LEVEL, chunk_size=None):
+        self.aes_key = aes_key or os.urandom(32)
+        self.cipher_mode = cipher_mode
+        self.cipher = PacketCipher(self.aes_key, cipher_mode)
         self.public_key = None
+        self.tickets = None  # TicketStore, opened on the first key exchange
         self.repair_port = 10000
         self.mcast_group = '224.1.1.1'
         self.mcast_port = 5007
-        self.sent_packets = {}
+        self.retransmit = None
+        self.files = []  # OutgoingFile per file in the session, ordered by seq_base
+        self.bases = []
         self.receivers = []  # List of (ip, tcp_port)
+        self.repair_server = None
+        self.repair_mode = repair_mode
+        self.rate = (rate_mbps, rate_pps, burst_packets)
+        self.fec_block = fec_block
+        self.stripes = max(1, stripes)
+        self.delta = delta
+        self.compression = compression
+        self.compression_level = compression_level
+        self.compressor = ChunkCompressor(compression, compression_level) if compression != "none" else None
+        if chunk_size is None:
+            mtu = MTU or discover_mtu(self.mcast_group, self.mcast_port)
+            chunk_size = pick_chunk_size(mtu, cipher_mode, self.compressor is not None, JUMBO_FRAMES)
+        self.chunk_size = chunk_size  # announced per file in the manifest
+        self.pacer = SendPacer(rate_mbps, rate_pps, burst_packets, chunk_size)
+        self.rate_control = None
+        if CONGESTION_CONTROL and self.pacer.bucket is not None and self.stripes == 1:
+            self.rate_control = RateController(self.pacer, CC_MIN_RATE_MBPS, CC_MAX_RATE_MBPS, CC_INCREASE_MBPS,
+                                               CC_DECREASE, CC_LOSS_THRESHOLD, CC_QUEUE_THRESHOLD,
+                                               FEEDBACK_INTERVAL)
+        self.metrics = Metrics("sender")
+        self.packets_sent = self.metrics.counter("packets_sent", "Data packets multicast in the first pass")
+        self.bytes_sent = self.metrics.counter("bytes_sent", "Datagram bytes multicast in the first pass")
+        self.parity_sent = self.metrics.counter("parity_packets_sent", "FEC parity packets multicast")
+        self.repair_bytes = self.metrics.counter("repair_bytes", "Packet bytes re-sent for repair")
+        self.encrypt_seconds = self.metrics.histogram("encrypt_seconds", "Time to seal one packet")
+        self.send_started = None
 
-    def tcp_key_exchange(self, ip, tcp_port):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((ip, tcp_port))
-        pem_data = b""
-        while True:
-            chunk = sock.recv(4096)
-            pem_data += chunk
-            if b"-----END PUBLIC KEY-----" in pem_data:
-                break
-        public_key = serialization.load_pem_public_key(pem_data, backend=default_backend())
-        encrypted_key = public_key.encrypt(
-            self.aes_key,
-            asym_padding.OAEP(
-                mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        sock.sendall(encrypted_key)
-        status = sock.recv(1024)
-        if status.strip() != b"READY":
-            console.print(f"[red]❌ Receiver at {ip}:{tcp_port} not ready[/red]")
-            sock.close()
-            return False
-        group_name = "default_group"
-        meta = f"{group_name},{self.mcast_group},{self.mcast_port}".encode()
-        sock.sendall(meta)
-        sock.close()
-        return True
-
-    def encrypt_packet(self, seq_num, message):
-        iv = os.urandom(self.iv_length)
-        padder = sym_padding.PKCS7(128).padder()
-        padded = padder.update(message) + padder.finalize()
-        cipher = Cipher(algorithms.AES(self.aes_key), modes.CBC(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
-        ciphertext = encryptor.update(padded) + encryptor.finalize()
-        checksum = blake2b(message, digest_size=32).digest()
-        return seq_num.to_bytes(4, 'big') + iv + ciphertext + checksum
-
-    def send_metadata(self, sock, multicast_ip, file_id, filename):
-        file_id_bytes = file_id.encode()
-        filename_bytes = os.path.basename(filename).encode()
-        file_id_len = len(file_id_bytes)
-        metadata_packet = METADATA_MAGIC + struct.pack(">H", file_id_len) + file_id_bytes + filename_bytes
-        sock.sendto(metadata_packet, (multicast_ip, self.mcast_port))
+    def tcp_key_exchange(self, ip, tcp_port, timeout=KEY_EXCHANGE_TIMEOUT):
+        # The whole exchange shares one deadline, so a receiver that accepts and
+        # then trickles (or never sends) its key cannot hold the sender past it
+        deadline = time.monotonic() + timeout
+
+        def remaining():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise socket.timeout("timed out")
+            return left
+
+        with socket.create_connection((ip, tcp_port), timeout=timeout) as sock:
+            sock.settimeout(remaining())
+            head = recv_exact(sock, len(HELLO_MAGIC))
+            if head is None:
+                raise ConnectionError("closed before the key exchange")
+            if head == HELLO_MAGIC:
+                mode = sender_exchange(sock, self.aes_key, self.tickets)
+            else:
+                # Receivers in HANDSHAKE_MODE "rsa" (and older ones) send a PEM key
+                mode = "rsa"
+                pem_data = head
+                while b"-----END PUBLIC KEY-----" not in pem_data:
+                    sock.settimeout(remaining())
+                    chunk = sock.recv(4096)
+                    if not chunk:
+                        raise ConnectionError("closed before sending its public key")
+                    pem_data += chunk
+                public_key = serialization.load_pem_public_key(pem_data, backend=default_backend())
+                if not isinstance(public_key, rsa.RSAPublicKey):
+                    raise ValueError("sent a public key that is not RSA")
+                encrypted_key = public_key.encrypt(
+                    self.aes_key,
+                    asym_padding.OAEP(
+                        mgf=asym_padding.MGF1(algorithm=hashes.SHA256()),
+                        algorithm=hashes.SHA256(),
+                        label=None
+                    )
+                )
+                sock.settimeout(remaining())
+                sock.sendall(encrypted_key)
+            sock.settimeout(remaining())
+            status = sock.recv(1024).strip()
+            if not status.startswith(b"READY"):
+                return mode, "not ready"
+            # Receivers answer "READY gcm,chacha20,cbc zlib,zstd". A bare READY comes from a
+            # receiver that predates the binary manifests and framed repair protocol
+            words = status.decode().split()
+            if len(words) < 2:
+                return mode, "is too old for this protocol (bare READY); update it"
+            offered = words[1].split(',')
+            codecs = words[2].split(',') if len(words) > 2 else []
+            if self.cipher_mode not in offered:
+                return mode, f"does not support {self.cipher_mode}"
+            if self.compression != "none" and self.compression not in codecs:
+                return mode, f"does not support {self.compression} compression"
+            group_name = "default_group"
+            meta = (f"{group_name},{self.mcast_group},{self.mcast_port},{self.cipher_mode},{self.stripes},"
+                    f"{self.compression}").encode()
+            sock.settimeout(remaining())
+            sock.sendall(meta)
+            # GO once the receiver has the group and port to itself; a receiver service
+            # already taking another transfer there answers BUSY instead of queueing us
+            sock.settimeout(remaining())
+            reply = sock.recv(16).strip()
+            if reply == b"BUSY":
+                return mode, f"is busy with another transfer on {self.mcast_group}:{self.mcast_port}"
+            if reply != b"GO":
+                return mode, "did not confirm the multicast channel"
+        return mode, None
+
+    def key_exchange_job(self, ip, tcp_port, timeout):
+        start = time.monotonic()
+        mode = None
+        try:
+            mode, error = self.tcp_key_exchange(ip, tcp_port, timeout)
+        except socket.timeout:
+            error = f"timed out after {timeout:g}s"
+        except (OSError, ValueError) as e:
+            error = str(e) or type(e).__name__
+        except Exception as e:
+            # Anything else one receiver triggers (an odd key type, say) is its own failure
+            error = f"{type(e).__name__}: {e}"
+        return ip, tcp_port, mode, error, time.monotonic() - start
+
+    def exchange_keys(self, targets, timeout=KEY_EXCHANGE_TIMEOUT, workers=KEY_EXCHANGE_WORKERS):
+        # All handshakes run at once, so setup takes as long as the slowest
+        # receiver (at most timeout) rather than the sum of all of them
+        start = time.monotonic()
+        if SESSION_TICKETS and self.tickets is None:
+            self.tickets = TicketStore(SENDER_TICKET_FILE, TICKET_LIFETIME)
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets)))) as pool:
+            jobs = [pool.submit(self.key_exchange_job, ip, port, timeout) for ip, port in targets]
+            for job in as_completed(jobs):
+                ip, port, mode, error, seconds = job.result()
+                results.append((ip, port, mode, error))
+                if error is None:
+                    console.print(f"[green]🔑 {ip}:{port} ready ({mode}, {seconds:.2f}s)[/green]")
+                else:
+                    console.print(f"[red]❌ Receiver at {ip}:{port}: {error}[/red]")
+        ready = [ip for ip, _, _, error in results if error is None]
+        elapsed = time.monotonic() - start
+        console.print(f"🤝 [cyan]Key exchange: {len(ready)}/{len(targets)} receivers ready in {elapsed:.2f}s[/cyan]")
+        self.metrics.gauge("key_exchange_seconds", "Time to set up every receiver").set(elapsed)
+        self.metrics.gauge("receivers_ready", "Receivers that completed the key exchange").set(len(ready))
+        self.metrics.gauge("receivers_failed", "Receivers that failed or timed out").set(len(targets) - len(ready))
+        self.metrics.gauge("receivers_resumed", "Receivers set up from a session ticket").set(
+            sum(1 for r in results if r[3] is None and r[2] == "ticket"))
+        return ready
+
+    def encrypt_packet(self, seq_num, message, kind=PACKET_DATA):
+        start = time.perf_counter()
+        packet = seq_num.to_bytes(4, 'big') + self.cipher.seal(seq_num, message, kind)
+        self.encrypt_seconds.observe(time.perf_counter() - start)
+        return packet
+
+    def build_message(self, file_id, seq, chunk):
+        header = struct.pack(">H", len(file_id.encode())) + file_id.encode() + struct.pack(">I", seq)
+        if self.compressor:
+            return header + self.compressor.pack(chunk)
+        return header + chunk
+
+    def build_packet(self, file_id, seq, chunk):
+        return self.encrypt_packet(seq, self.build_message(file_id, seq, chunk))
+
+    def send_parity(self, out, block):
+        block_index, body = block
+        packet = FEC_MAGIC + self.encrypt_packet(block_index, body, PACKET_PARITY)
+        self.pacer.wait(len(packet))
+        out.send(packet)
+        self.parity_sent.inc()
+
+    def recipe_packets(self, outgoing):
+        return [DELTA_MAGIC + self.encrypt_packet(seq, digests, PACKET_RECIPE) for seq, digests in outgoing.recipe()]
+
+    def send_packets(self, out, packets):
+        for packet in packets:
+            self.pacer.wait(len(packet))
+            out.send(packet)
+
+    def load_packet(self, seq):
+        # Cache miss during repair: re-read the chunk by offset and encrypt it again
+        outgoing = find_owner(self.files, self.bases, seq)
+        if outgoing is None:
+            return None
+        was_changed = outgoing.changed
+        chunk = outgoing.read_chunk(seq)
+        if outgoing.changed and not was_changed:
+            console.print(f"[red]❌ {outgoing.name} changed during the transfer; its chunks can no longer be "
+                          f"repaired[/red]")
+        if not chunk:
+            return None
+        return self.build_packet(outgoing.file_id, seq, chunk)
+
+    def build_manifest(self, outgoing):
+        file_id_bytes = outgoing.file_id.encode()
+        body = (struct.pack(">H", len(file_id_bytes)) + file_id_bytes +
+                struct.pack(">HQIIII", self.fec_block, outgoing.size, outgoing.seq_base, outgoing.total,
+                            outgoing.chunk_size, len(self.files)) +
+                outgoing.digest + outgoing.name.encode())
+        # Sealed like data so names and hashes stay private and cannot be forged
+        return METADATA_MAGIC + self.encrypt_packet(outgoing.seq_base, body, PACKET_MANIFEST)
+
+    def manifest_packets(self):
+        # Same plaintext under the same seq_base as the multicast copies, so resealing is safe
+        return [self.build_manifest(outgoing) for outgoing in self.files]
+
+    def send_metadata(self, out, outgoing):
+        packet = self.build_manifest(outgoing)
+        self.pacer.wait(len(packet))
+        out.send(packet)
+
+    def plan_files(self, path):
+        # Each file starts on a fresh FEC block so no parity block spans two files.
+        # Empty files still take a slot: the manifest is sealed under seq_base, and
+        # two manifests must never share a nonce.
+        align = max(1, self.fec_block)
+        files = []
+        seq_base = 0
+        for full_path, name in collect_files(path):
+            outgoing = OutgoingFile(full_path, name, seq_base, self.chunk_size)
+            files.append(outgoing)
+            seq_base += max(1, -(-outgoing.total // align)) * align
+        if seq_base >= 2 ** 32:
+            raise ValueError("❌ Session too large: more than 2^32 chunks")
+        return files
 
     def chunk_file(self, filepath, chunk_size):
         with open(filepath, 'rb') as f:
@@ -86,90 +278,228 @@ class SecureSender:
                     break
                 yield chunk
 
-    def send_multicast(self, filepath):
-        file_id = str(uuid.uuid4())
-        filename = os.path.basename(filepath)
+    def stripe_run(self):
+        # Runs are whole FEC blocks so every parity block stays on one stripe
+        align = max(1, self.fec_block)
+        return -(-STRIPE_RUN // align) * align
+
+    def chunk_runs(self, outgoing, stripe, stripes):
+        if stripes == 1:
+            for i, chunk in enumerate(self.chunk_file(outgoing.path, outgoing.chunk_size)):
+                yield outgoing.seq_base + i, chunk
+            return
+        run = self.stripe_run()
+        with open(outgoing.path, 'rb') as f:
+            for start in range(stripe * run, outgoing.total, stripes * run):
+                f.seek(start * outgoing.chunk_size)
+                for i in range(start, min(start + run, outgoing.total)):
+                    yield outgoing.seq_base + i, f.read(outgoing.chunk_size)
+
+    def send_file(self, out, outgoing, stripe=0, stripes=1):
+        fec = FecEncoder(self.fec_block) if self.fec_block else None
+        sent = 0
+        for seq, chunk in self.chunk_runs(outgoing, stripe, stripes):
+            msg = self.build_message(outgoing.file_id, seq, chunk)
+            packet = self.encrypt_packet(seq, msg)
+            self.pacer.wait(len(packet))
+            out.send(packet)
+            if self.retransmit is not None:
+                self.retransmit.put(seq, packet)
+            sent += 1
+            self.packets_sent.inc()
+            self.bytes_sent.inc(len(packet))
+            if sent % MANIFEST_EVERY == 0:
+                self.send_metadata(out, outgoing)  # for receivers that lost the earlier copies
+            if fec:
+                block = fec.add(seq, msg)
+                if block:
+                    self.send_parity(out, block)
+        if fec:
+            block = fec.flush()
+            if block:
+                self.send_parity(out, block)
+        return sent
 
+    def open_multicast_socket(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
         sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', 1))
+        return sock
 
-        self.send_metadata(sock, self.mcast_group, file_id, filename)
-        console.print("📡 [cyan]Sending multicast packets...[/cyan]")
-        for i, chunk in enumerate(self.chunk_file(filepath, CHUNK_SIZE)):
-            header = struct.pack(">H", len(file_id.encode())) + file_id.encode() + struct.pack(">I", i)
-            msg = header + chunk
-            packet = self.encrypt_packet(i, msg)
-            sock.sendto(packet, (self.mcast_group, self.mcast_port))
-            self.sent_packets[i] = packet
-            print(f"✅ Sent packet {i}")
-            if i % 500 == 0:
-                time.sleep(0.0001)  # Sleep for 10μs every 100 packets
-        time.sleep(0.0001)
-        sock.sendto(b"EOF", (self.mcast_group, self.mcast_port))
+    def send_stripe(self, stripe, stripes):
+        # Runs in a worker process; sends its share of every file, then its EOF
+        port = self.mcast_port + stripe
+        sock = self.open_multicast_socket()
+        out = DatagramSender(sock, (self.mcast_group, port), IO_BATCH_SIZE)
+        sent = sum(self.send_file(out, outgoing, stripe, stripes) for outgoing in self.files)
+        if stripe == 0:
+            for outgoing in self.files:
+                self.send_metadata(out, outgoing)
+        out.flush()
+        self.pacer.wait(3)
+        sock.sendto(b"EOF", (self.mcast_group, port))
         sock.close()
+        return sent, out.syscalls
+
+    def send_striped(self):
+        # Spawned, not forked: the repair server's event loop thread and the console
+        # may hold locks at fork time. A stripe that dies is reported rather than
+        # waited on; receivers repair its chunks once the first pass times out.
+        sent = syscalls = 0
+        with ProcessPoolExecutor(self.stripes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            jobs = {pool.submit(_stripe_worker, self.stripe_job(stripe)): stripe for stripe in range(self.stripes)}
+            for job, stripe in jobs.items():
+                try:
+                    stripe_sent, stripe_syscalls = job.result()
+                except Exception as e:
+                    console.print(f"[red]❌ Stripe {stripe} failed: {e!r}[/red]")
+                    continue
+                sent += stripe_sent
+                syscalls += stripe_syscalls
+        return sent, syscalls
+
+    def stripe_job(self, stripe):
+        rate_mbps, rate_pps, burst_packets = self.rate
+        return {
+            "stripe": stripe,
+            "stripes": self.stripes,
+            "aes_key": self.aes_key,
+            "cipher_mode": self.cipher_mode,
+            "rate_mbps": rate_mbps / self.stripes if rate_mbps else None,
+            "rate_pps": rate_pps / self.stripes if rate_pps else None,
+            "burst_packets": burst_packets,
+            "fec_block": self.fec_block,
+            "compression": (self.compression, self.compression_level),
+            "chunk_size": self.chunk_size,
+            "mcast": (self.mcast_group, self.mcast_port),
+            "files": self.files,
+        }
+
+    def send_multicast(self, path):
+        # path may be a single file or a directory tree; either way one session
+        self.files = self.plan_files(path)
+        self.bases = [f.seq_base for f in self.files]
+        if self.repair_server is not None:
+            self.repair_server.seq_limit = self.seq_limit()
+        self.retransmit = RetransmitCache(self.load_packet, RETRANSMIT_CACHE_BYTES)
+        self.send_started = time.perf_counter()
+
+        console.print(f"📡 [cyan]Sending {len(self.files)} file(s) by multicast in {self.chunk_size}-byte chunks "
+                      f"({self.pacer.describe()})...[/cyan]")
+        sock = self.open_multicast_socket()
+        out = DatagramSender(sock, (self.mcast_group, self.mcast_port), IO_BATCH_SIZE)
+        for outgoing in self.files:
+            self.send_metadata(out, outgoing)
+        out.flush()
+
+        if self.delta:
+            sent, syscalls = self.send_delta(sock, out)
+        elif self.stripes > 1:
+            # Stripe workers start with an empty cache; repair re-reads on a miss
+            console.print(f"🧵 [cyan]Striping across {self.stripes} ports from {self.mcast_port}[/cyan]")
+            sock.close()
+            sent, syscalls = self.send_striped()
+            self.packets_sent.inc(sent)  # the workers' own metrics stay in their processes
+        else:
+            sent = sum(self.send_file(out, outgoing) for outgoing in self.files)
+            for outgoing in self.files:
+                self.send_metadata(out, outgoing)
+            out.flush()
+            syscalls = out.syscalls
+            self.pacer.wait(3)
+            sock.sendto(b"EOF", (self.mcast_group, self.mcast_port))
+            sock.close()
+        console.print(f"✅ Sent {sent} packets in {syscalls} send calls")
+        if self.rate_control is not None and self.rate_control.reports:
+            console.print(f"🚦 Send rate ended at {self.rate_control.rate:.0f} Mbps after "
+                          f"{self.rate_control.decreases} cuts and {self.rate_control.increases} steps up")
+        if self.compressor and self.stripes == 1:
+            console.print(f"🗜️ Compressed {self.compressor.packed} of {self.compressor.packed + self.compressor.raw} "
+                          f"chunks with {self.compression}")
         console.print("🛑 [green]EOF sent.[/green]")
 
+    def send_delta(self, sock, out):
+        # Only the chunk recipes go out; receivers copy what their old version already
+        # holds and NACK the rest, so repair multicasts just the chunks someone lacks
+        console.print("🔀 [cyan]Delta sync: sending chunk recipes only[/cyan]")
+        # Sealed once and sent again as is: re-reading for each copy could seal a
+        # file edited in between under the same recipe nonce
+        recipes = [self.recipe_packets(outgoing) for outgoing in self.files]
+        for _ in range(DELTA_RECIPE_COPIES):
+            for packets in recipes:
+                self.send_packets(out, packets)
+        for outgoing in self.files:
+            self.send_metadata(out, outgoing)
+        out.flush()
+        self.pacer.wait(3)
+        for stripe in range(self.stripes):
+            sock.sendto(b"EOF", (self.mcast_group, self.mcast_port + stripe))
+        sock.close()
+        return 0, out.syscalls
+
+    def start_repair_server(self):
+        if self.repair_server is None:
+            self.repair_server = RepairServer(get_current_ip(), self.repair_port, self.receivers,
+                                              self.repair_packet,
+                                              REPAIR_IDLE_TIMEOUT, REPAIR_MAX_SECONDS,
+                                              self.resend_multicast if self.repair_mode == "multicast" else None,
+                                              REPAIR_AGGREGATE_WINDOW, self.on_feedback, REPAIR_RESUME_GRACE,
+                                              self.manifest_packets)
+            self.repair_server.seq_limit = self.seq_limit()
+            self.repair_server.start()
+
+    def seq_limit(self):
+        return self.files[-1].seq_base + self.files[-1].total if self.files else 0
+
+    def on_feedback(self, addr, payload):
+        if self.rate_control is None or len(payload) != FEEDBACK.size:
+            return
+        loss, queue = FEEDBACK.unpack(payload)
+        self.rate_control.report(addr, loss, queue)
+
+    def repair_packet(self, seq):
+        packet = self.retransmit.get(seq)
+        if packet is not None:
+            self.repair_bytes.inc(len(packet))
+        return packet
+
+    def resend_multicast(self, seqs):
+        # One paced multicast of the union of NACKs; receivers drop what they have
+        sock = self.open_multicast_socket()
+        out = DatagramSender(sock, (self.mcast_group, self.mcast_port), IO_BATCH_SIZE)
+        sent = 0
+        for seq in seqs:
+            packet = self.repair_packet(seq)
+            if packet is None:
+                continue
+            self.pacer.wait(len(packet))
+            out.send(packet)
+            sent += 1
+        out.flush()
+        sock.close()
+        return sent
+
     def handle_repair(self):
-        sel = selectors.DefaultSelector()
-        server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_sock.bind((get_current_ip(), self.repair_port))
-        server_sock.listen()
-        server_sock.setblocking(False)
-        sel.register(server_sock, selectors.EVENT_READ, data=None)
-
-        console.print(f"🔧 [yellow]Repair server listening on {get_current_ip()}:{self.repair_port}[/yellow]")
-
-        def service_connection(key, mask):
-            sock = key.fileobj
-            addr = key.data["addr"]
-            try:
-                data = sock.recv(4096)
-                if not data:
-                    sel.unregister(sock)
-                    sock.close()
-                    return
-
-                if data == b"COMPLETE":
-                    console.print(f"✅ Receiver at {addr} completed transmission.")
-                    sel.unregister(sock)
-                    sock.close()
-                    return
-
-                missing = data.decode().split(',')
-                console.print(f"🔁 [cyan]Resending {len(missing)} packets to {addr}[/cyan]")
-                for m in missing:
-                    try:
-                        seq = int(m)
-                        if seq in self.sent_packets:
-                            sock.sendall(self.sent_packets[seq])
-                            console.print(f"🔁 Resent packet {seq} to {addr}")
-                    except Exception as e:
-                        console.print(f"[red]❌ Failed to send packet {m} to {addr}: {e}[/red]")
-
-                sel.unregister(sock)
-                sock.close()
-            except Exception as e:
-                console.print(f"[red]❌ Error handling repair request from {addr}: {e}[/red]")
-                sel.unregister(sock)
-                sock.close()
-
-        # Wait for repair requests for a fixed duration or until all are done
-        timeout = time.time() + 10  # seconds
-        while time.time() < timeout:
-            events = sel.select(timeout=1)
-            for key, mask in events:
-                if key.data is None:
-                    conn, addr = key.fileobj.accept()
-                    conn.setblocking(False)
-                    console.print(f"🔧 Repair connection from {addr}")
-                    sel.register(conn, selectors.EVENT_READ, data={"addr": addr[0]})
-                else:
-                    service_connection(key, mask)
+        # Ends as soon as every receiver reports COMPLETE, or once repair goes idle
+        self.start_repair_server()
+        self.repair_server.wait()
+        self.metrics.gauge("repair_rounds", "Repair rounds served").set(self.repair_server.rounds)
+        self.metrics.gauge("repair_packets", "Packets re-sent for repair").set(self.repair_server.packets_resent)
+        self.repair_server = None
+
+    def export_metrics(self):
+        payload = sum(f.size for f in self.files)
+        self.metrics.gauge("payload_bytes", "File bytes in the session").set(payload)
+        if self.send_started is not None:
+            elapsed = time.perf_counter() - self.send_started
+            self.metrics.gauge("transfer_seconds", "First packet to end of repair").set(elapsed)
+            self.metrics.gauge("goodput_mbps", "File bits per second, end to end").set(payload * 8 / elapsed / 1e6)
+        if self.rate_control is not None:
+            self.metrics.gauge("send_rate_mbps", "Paced rate at the end of the transfer").set(self.rate_control.rate)
+            self.metrics.gauge("rate_decreases", "Multiplicative rate cuts").set(self.rate_control.decreases)
+            self.metrics.gauge("rate_increases", "Additive rate steps").set(self.rate_control.increases)
+        path = self.metrics.export(METRICS_DIR, METRICS_PROMETHEUS)
+        console.print(f"📊 [cyan]Metrics written to {path}[/cyan]")
 
-        sel.close()
-        server_sock.close()
-        console.print("[green]✅ Repair session ended[/green]")
     def run(self):
         console.print(Align.center(Panel.fit("[bold blue]🚀 Starting Secure Multicast Sender[/bold blue]")))
 
@@ -179,21 +509,28 @@ class SecureSender:
         if not selected:
             return
 
-        # Key exchange with all selected receivers
-        for info in selected:
-            ip = socket.inet_ntoa(info.addresses[0])
-            port = info.port
-            if self.tcp_key_exchange(ip, port):
-                self.receivers.append(ip)
+        # Key exchange with all selected receivers at once
+        targets = [(socket.inet_ntoa(info.addresses[0]), info.port) for info in selected]
+        self.receivers.extend(self.exchange_keys(targets))
 
         if not self.receivers:
             console.print("[red]No receivers successfully initialized.[/red]")
             return
 
-        file_path = get_file_path()
+        file_path = get_file_path(allow_dirs=True)
+        self.start_repair_server()  # up before the first EOF so no receiver gets refused
         self.send_multicast(file_path)
         self.handle_repair()
+        self.export_metrics()
         print("🎉 Transmission completed successfully!")
 
+def _stripe_worker(job):
+    sender = SecureSender(job["rate_mbps"], job["rate_pps"], job["burst_packets"], job["fec_block"],
+                          job["cipher_mode"], aes_key=job["aes_key"], compression=job["compression"][0],
+                          compression_level=job["compression"][1], chunk_size=job["chunk_size"])
+    sender.mcast_group, sender.mcast_port = job["mcast"]
+    sender.files = job["files"]
+    return sender.send_stripe(job["stripe"], job["stripes"])
+
 if __name__ == "__main__":
     SecureSender().run()
\ No newline at end of file
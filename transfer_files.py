@@ -0,0 +1,175 @@
+import os
+import uuid
+from hashlib import blake2b
+from bisect import bisect_right
+from config import CHUNK_SIZE
+from fec import FecDecoder
+from file_sink import FileSink
+from nack import ChunkBitmap
+
+# Every file in a session owns a contiguous slice of one session-wide seq
+# space starting at its seq_base, so seq numbers (and the AEAD nonces derived
+# from them) never repeat across files, and repair can speak in plain seqs.
+
+CHUNK_DIGEST_SIZE = 16
+FILE_DIGEST_SIZE = 32
+
+
+def collect_files(path):
+    path = os.path.abspath(path)
+    if os.path.isfile(path):
+        return [(path, os.path.basename(path))]
+    root = os.path.dirname(path)
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            full = os.path.join(dirpath, name)
+            if os.path.isfile(full):
+                files.append((full, os.path.relpath(full, root).replace(os.sep, '/')))
+    return files
+
+
+def safe_relpath(name):
+    parts = [p for p in name.replace('\\', '/').split('/') if p not in ('', '.')]
+    if not parts or '..' in parts:
+        raise ValueError(f"Unsafe file name from sender: {name!r}")
+    return os.path.join(*parts)
+
+
+def chunk_digest(chunk):
+    return blake2b(chunk, digest_size=CHUNK_DIGEST_SIZE).digest()
+
+
+def file_digest(path):
+    digest = blake2b(digest_size=FILE_DIGEST_SIZE)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def find_owner(files, bases, seq):
+    # files are kept sorted by seq_base, bases mirrors their seq_base values
+    i = bisect_right(bases, seq) - 1
+    if i >= 0 and files[i].owns(seq):
+        return files[i]
+    return None
+
+
+class OutgoingFile:
+    def __init__(self, path, name, seq_base, chunk_size=CHUNK_SIZE):
+        self.file_id = str(uuid.uuid4())
+        self.path = path
+        self.name = name
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns  # a repair re-read must see the file as planned
+        self.changed = False
+        self.seq_base = seq_base
+        self.chunk_size = chunk_size
+        self.total = -(-self.size // chunk_size)
+        self.digest = file_digest(path)
+
+    def owns(self, seq):
+        return self.seq_base <= seq < self.seq_base + self.total
+
+    def unchanged(self, f):
+        stat = os.fstat(f.fileno())
+        if (stat.st_size, stat.st_mtime_ns) != (self.size, self.mtime):
+            self.changed = True
+        return not self.changed
+
+    def read_chunk(self, seq):
+        # Re-sealing different bytes under the chunk's seq would reuse its nonce,
+        # so a file edited since it was planned is not read again
+        with open(self.path, 'rb') as f:
+            if not self.unchanged(f):
+                return None
+            f.seek((seq - self.seq_base) * self.chunk_size)
+            chunk = f.read(self.chunk_size)
+            return chunk if self.unchanged(f) else None
+
+    def recipe(self):
+        # (first seq, concatenated chunk digests), as many digests as fit in one chunk-sized packet
+        per_packet = self.chunk_size // CHUNK_DIGEST_SIZE
+        seq = self.seq_base
+        with open(self.path, 'rb') as f:
+            while True:
+                digests = []
+                for _ in range(per_packet):
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digests.append(chunk_digest(chunk))
+                if not digests:
+                    return
+                yield seq, b"".join(digests)
+                seq += len(digests)
+
+
+class IncomingFile:
+    def __init__(self, file_id, name, size, seq_base, fec_block, output_dir, checkpoint_bits=None, digest=None,
+                 chunk_size=CHUNK_SIZE):
+        self.file_id = file_id
+        self.name = name
+        self.size = size
+        self.seq_base = seq_base
+        self.fec_block = fec_block
+        self.digest = digest  # whole-file blake2b from the manifest
+        self.chunk_size = chunk_size
+        self.total = -(-size // chunk_size)
+        self.received = ChunkBitmap(self.total)
+        path = os.path.join(output_dir, safe_relpath(name))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.sink = FileSink(path, size, resume=checkpoint_bits is not None)
+        if self.sink.resumed:
+            self.received.load(checkpoint_bits)
+        self.saved_count = self.received.count  # progress already in the checkpoint store
+        self.fec = FecDecoder(fec_block) if fec_block else None
+        self.recipe = {}  # chunk index -> digest, from delta-sync recipe packets
+
+    def owns(self, seq):
+        return self.seq_base <= seq < self.seq_base + self.total
+
+    def write(self, seq, payload):
+        index = seq - self.seq_base
+        if index in self.received:
+            return False
+        self.sink.write_at(index * self.chunk_size, payload)
+        self.received.add(index)
+        return True
+
+    def add_recipe(self, first_index, digests):
+        for i in range(0, len(digests), CHUNK_DIGEST_SIZE):
+            if first_index < self.total:
+                self.recipe[first_index] = digests[i:i + CHUNK_DIGEST_SIZE]
+            first_index += 1
+
+    def reuse_local_chunks(self):
+        # Delta sync: any chunk of the existing copy whose digest the recipe names is
+        # copied into the new file. Chunks are fixed-size, so only aligned content matches.
+        if not self.recipe or not os.path.isfile(self.sink.final_path):
+            return 0
+        wanted = {}
+        for index, digest in self.recipe.items():
+            if index not in self.received:
+                wanted.setdefault(digest, []).append(index)
+        reused = 0
+        with open(self.sink.final_path, 'rb') as f:
+            while wanted:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                for index in wanted.pop(chunk_digest(chunk), ()):
+                    reused += self.write(self.seq_base + index, chunk)
+        return reused
+
+    def complete(self):
+        return self.received.complete()
+
+    def verify(self):
+        return self.digest is None or file_digest(self.sink.part_path) == self.digest
+
+    def finish(self):
+        return self.sink.finish()
@@ -0,0 +1,179 @@
+import heapq
+import random
+import socket
+import struct
+import threading
+import time
+import argparse
+
+# A multicast relay for testing on one machine: it joins the group on the
+# ports the sender writes to and re-sends every datagram to the same group on
+# the ports the receivers listen on, dropping, duplicating, delaying and
+# reordering on the way. Each port gets its own seeded random stream, so the
+# same seed drops the same packets of each stream on every run.
+
+
+class LossProfile:
+    def __init__(self, loss=0.0, burst_rate=0.0, burst_length=4.0, reorder=0.0, reorder_delay=0.002,
+                 duplicate=0.0, delay=0.0, jitter=0.0, seed=0):
+        self.loss = loss  # independent drop probability per packet
+        self.burst_rate = burst_rate  # chance per packet of entering a loss burst (Gilbert-Elliott)
+        self.burst_length = burst_length  # mean packets lost per burst
+        self.reorder = reorder  # chance a packet is held back so later ones overtake it
+        self.reorder_delay = reorder_delay
+        self.duplicate = duplicate
+        self.delay = delay  # seconds added to every packet
+        self.jitter = jitter  # uniform extra delay in [0, jitter)
+        self.seed = seed
+
+
+class LossyStream:
+    def __init__(self, profile, seed):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.in_burst = False
+        self.dropped = 0
+        self.reordered = 0
+        self.duplicated = 0
+
+    def fate(self):
+        # Returns the delays (seconds) at which copies of the packet go out; empty means dropped
+        p = self.profile
+        rng = self.rng
+        if self.in_burst:
+            self.in_burst = rng.random() >= 1.0 / max(p.burst_length, 1.0)
+        elif p.burst_rate and rng.random() < p.burst_rate:
+            self.in_burst = True
+        if self.in_burst or (p.loss and rng.random() < p.loss):
+            self.dropped += 1
+            return []
+        delay = p.delay + (rng.random() * p.jitter if p.jitter else 0.0)
+        if p.reorder and rng.random() < p.reorder:
+            delay += p.reorder_delay
+            self.reordered += 1
+        copies = [delay]
+        if p.duplicate and rng.random() < p.duplicate:
+            copies.append(delay + (rng.random() * p.jitter if p.jitter else 0.0))
+            self.duplicated += 1
+        return copies
+
+
+class LossyRelay:
+    def __init__(self, group, in_port, out_port, stripes=1, profile=None, protect_eof=True):
+        self.group = group
+        self.in_port = in_port
+        self.out_port = out_port
+        self.stripes = stripes
+        self.profile = profile or LossProfile()
+        self.protect_eof = protect_eof  # EOF markers always get through, so a first pass can end
+        self.queue = []  # (due time, order, packet, port)
+        self.order = 0
+        self.cond = threading.Condition()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.streams = []
+        self.received = 0
+        self.forwarded = 0
+        self.out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.out.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', 1))
+
+    def open_socket(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        sock.bind(('', port))
+        mreq = struct.pack("4sl", socket.inet_aton(self.group), socket.INADDR_ANY)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        sock.settimeout(0.2)
+        return sock
+
+    def start(self):
+        for k in range(self.stripes):
+            stream = LossyStream(self.profile, self.profile.seed * 1000 + k)
+            self.streams.append(stream)
+            sock = self.open_socket(self.in_port + k)
+            self.threads.append(threading.Thread(target=self.relay_loop, args=(sock, stream, self.out_port + k),
+                                                 daemon=True))
+        self.threads.append(threading.Thread(target=self.deliver_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dropped": sum(s.dropped for s in self.streams),
+            "reordered": sum(s.reordered for s in self.streams),
+            "duplicated": sum(s.duplicated for s in self.streams),
+            "forwarded": self.forwarded,
+        }
+
+    def stop(self):
+        self.stopping.set()
+        with self.cond:
+            self.cond.notify()
+        for thread in self.threads:
+            thread.join()
+        self.out.close()
+
+    def relay_loop(self, sock, stream, port):
+        while not self.stopping.is_set():
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                continue
+            now = time.perf_counter()
+            copies = [0.0] if self.protect_eof and data == b"EOF" else stream.fate()
+            with self.cond:
+                self.received += 1
+                for delay in copies:
+                    heapq.heappush(self.queue, (now + delay, self.order, data, port))
+                    self.order += 1
+                self.cond.notify()
+        sock.close()
+
+    def deliver_loop(self):
+        while True:
+            with self.cond:
+                while not self.stopping.is_set():
+                    if self.queue:
+                        wait = self.queue[0][0] - time.perf_counter()
+                        if wait <= 0:
+                            break
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+                if self.stopping.is_set():
+                    return
+                _, _, data, port = heapq.heappop(self.queue)
+                self.forwarded += 1
+            self.out.sendto(data, (self.group, port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lossy multicast relay for local transfer tests")
+    parser.add_argument("--group", default="224.1.1.1")
+    parser.add_argument("--in-port", type=int, default=5007, help="First port the sender multicasts to")
+    parser.add_argument("--out-port", type=int, default=6007, help="First port the receivers listen on")
+    parser.add_argument("--stripes", type=int, default=1)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--burst-rate", type=float, default=0.0)
+    parser.add_argument("--burst-length", type=float, default=4.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--reorder-delay", type=float, default=0.002)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    profile = LossProfile(args.loss, args.burst_rate, args.burst_length, args.reorder, args.reorder_delay,
+                          args.duplicate, args.delay, args.jitter, args.seed)
+    relay = LossyRelay(args.group, args.in_port, args.out_port, args.stripes, profile).start()
+    print(f"🔀 Relaying {args.group}:{args.in_port} -> :{args.out_port} ({args.stripes} port(s)); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        relay.stop()
+        print(f"📊 {relay.stats()}")
@@ -23,9 +23,10 @@ class PathCompleter(Completer):
                 display=display
             )
 
-def get_file_path():
+def get_file_path(allow_dirs=False):
+    label = "📁 Select file or folder: " if allow_dirs else "📁 Select file: "
     while True:
-        file_path = prompt("📁 Select file: ", completer=PathCompleter(), complete_while_typing=True)
-        if os.path.isfile(file_path):
+        file_path = prompt(label, completer=PathCompleter(), complete_while_typing=True)
+        if os.path.isfile(file_path) or (allow_dirs and os.path.isdir(file_path)):
             return file_path
         print("❌ Invalid file. Please try again.")